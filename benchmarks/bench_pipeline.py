@@ -0,0 +1,167 @@
+# ====================================================================
+# VISO KONVEJERIO BENCHMARK'AS (be tinklo)
+#
+# main.create_rss() paleidžiamas su vietiniais pakaitalais (fakes.py):
+# sugeneruotas Telegram kanalas, failų sistemos bucket'as ir vietinis
+# HTTP serveris vietoj DeepSeek ir Make. Kiekvienas scenarijus - švariame
+# laikiname kataloge (docs/, state.db, cache).
+#
+# Scenarijai:
+#   empty       – naujų postų nėra (checkpoint'as ties naujausiu postu)
+#   cold14      – pirmas paleidimas, 14 postų (su albumais)
+#   backlog200  – 200 naujų postų nuo checkpoint'o
+#   flaky_llm   – kaip cold14, bet DeepSeek lėtas ir 30 % užklausų - 503
+#
+# Matuojama: laikas (wall), pralaidumas (žinutės/s, MB/s), didžiausia
+# Python atmintis (tracemalloc, atskiras paleidimas) ir lėčiausios pakopos
+# iš docs/run_report.json.
+#
+# Paleidimas:
+#   python benchmarks/bench_pipeline.py                    # visi scenarijai
+#   python benchmarks/bench_pipeline.py cold14 --json po.json --baseline pries.json
+# ====================================================================
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fakes  # noqa: E402
+import main  # noqa: E402
+import outbox  # noqa: E402
+import state_store  # noqa: E402
+import translate_pipeline  # noqa: E402
+
+CHANNEL = main.LEGACY_CHANNEL
+
+SCENARIOS = {
+    "empty": {"posts": 14, "caught_up": True},
+    "cold14": {"posts": 14},
+    "backlog200": {"posts": 230, "checkpoint_after": 30},
+    "flaky_llm": {"posts": 14, "llm_latency": 0.4, "llm_error_rate": 0.3},
+}
+
+
+def _prepare(workdir, spec, server):
+    os.chdir(workdir)
+    os.makedirs("docs", exist_ok=True)
+    messages = fakes.make_channel(spec["posts"], video_size=spec.get("video_size", 2 << 20))
+
+    # Būsena prieš paleidimą: checkpoint'as (jei scenarijus jį turi)
+    store = state_store.StateStore()
+    if spec.get("caught_up"):
+        store.set_checkpoint(max(m.id for m in messages))
+    elif spec.get("checkpoint_after"):
+        store.set_checkpoint(sorted(m.id for m in messages)[spec["checkpoint_after"]])
+    store.close()
+
+    telegram = fakes.FakeTelegram({CHANNEL: messages})
+    main.client = telegram
+    main.bucket = fakes.FsBucket(os.path.join(workdir, "bucket"))
+    main.CHANNELS = [CHANNEL]
+    main.DEEPSEEK_API_KEY = "bench"
+    translate_pipeline.DEEPSEEK_URL = server.url + "/deepseek/chat/completions"
+    translate_pipeline._cache = None
+    outbox.MAKE_WEBHOOK_URL = server.url + "/make"
+    return telegram
+
+
+def run_once(name, spec, trace_memory=False):
+    config = fakes.StubConfig(latency=spec.get("llm_latency", 0.05),
+                              error_rate=spec.get("llm_error_rate", 0.0))
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix=f"bench_{name}_") as workdir, \
+            fakes.StubServer(config) as server:
+        try:
+            telegram = _prepare(workdir, spec, server)
+            if trace_memory:
+                tracemalloc.start()
+            started = time.perf_counter()
+            asyncio.run(main.create_rss())
+            wall = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+            with open("docs/run_report.json") as f:
+                report = json.load(f)
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+            os.chdir(cwd)
+
+    messages = report["counters"].get("telegram.messages", 0)
+    media_bytes = report["counters"].get("media.bytes_downloaded", 0)
+    stages = sorted(report["stages"].items(), key=lambda kv: -kv[1]["total_s"])
+    return {
+        "wall_s": round(wall, 3),
+        "messages": messages,
+        "messages_per_s": round(messages / wall, 1) if wall else 0.0,
+        "media_mb_per_s": round(media_bytes / 1e6 / wall, 1) if wall else 0.0,
+        "peak_mb": round(peak / 1e6, 1) if peak is not None else None,
+        "telegram_requests": telegram.requests,
+        "llm_calls": config.calls["deepseek"],
+        "llm_errors": config.calls["errors"],
+        "top_stages": {n: s["total_s"] for n, s in stages[:4]},
+    }
+
+
+def run_scenario(name, repeat):
+    spec = SCENARIOS[name]
+    runs = [run_once(name, spec) for _ in range(repeat)]
+    result = min(runs, key=lambda r: r["wall_s"])  # mažiausias triukšmas
+    result["peak_mb"] = run_once(name, spec, trace_memory=True)["peak_mb"]
+    return result
+
+
+def _delta(new, old):
+    if not old:
+        return ""
+    return f" ({(new - old) / old * 100:+.0f} %)"
+
+
+def print_results(results, baseline):
+    print(f"\n{'scenarijus':<12}{'laikas s':>16}{'žin./s':>10}{'MB/s':>8}"
+          f"{'atmintis MB':>20}{'TG užkl.':>10}{'LLM (klaidos)':>15}")
+    for name, r in results.items():
+        old = baseline.get(name, {})
+        print(f"{name:<12}{r['wall_s']:>8.2f}{_delta(r['wall_s'], old.get('wall_s')):>8}"
+              f"{r['messages_per_s']:>10}{r['media_mb_per_s']:>8}"
+              f"{r['peak_mb']:>10}{_delta(r['peak_mb'], old.get('peak_mb')):>10}"
+              f"{r['telegram_requests']:>10}{r['llm_calls']:>9} ({r['llm_errors']})")
+        print("            " + ", ".join(f"{n} {s:.2f}s" for n, s in r["top_stages"].items()))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Offline create_rss() benchmark'as")
+    parser.add_argument("scenarios", nargs="*", metavar="scenarijus",
+                        help=", ".join(SCENARIOS) + " (numatyta - visi)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--json", help="rezultatus įrašyti į JSON (palyginimui)")
+    parser.add_argument("--baseline", help="ankstesnis --json failas palyginimui")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"nežinomi scenarijai: {', '.join(sorted(unknown))}")
+
+    logging.getLogger().setLevel(logging.ERROR)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {name: run_scenario(name, args.repeat) for name in args.scenarios or SCENARIOS}
+    print_results(results, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,75 @@
+# ====================================================================
+# SAUGIKLIO TAISYKLIŲ MIKRO-BENCHMARK'AS
+#
+# Matuoja, kiek trunka patikrinti tipinį postą, kai juodasis sąrašas
+# auga (prie tikrų taisyklių pridedama N sugeneruotų frazių). Lyginama:
+#   naive  – atskiras re.search kiekvienai taisyklei (senas hard_check būdas)
+#   engine – RuleEngine.scan (vienas bendras regex, frazės – trie)
+#   batch  – RuleEngine.scan_batch, 50 tekstų vienu praėjimu (vienam tekstui)
+#
+# Paleidimas:  python benchmarks/bench_rule_engine.py
+# ====================================================================
+
+import os
+import re
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rule_engine import Rule, RuleEngine  # noqa: E402
+import translate_pipeline  # noqa: E402
+
+RULE_COUNTS = [0, 100, 500, 1000, 5000]
+REPEAT = 200
+BATCH = 50
+LETTERS = "abcdeghijklmnoprstuvyzšžąčęėįųū"
+
+SAMPLE = (
+    "Naujausios žinios iš Ukrainos. 🔴 Rusijos kariuomenė naktį apšaudė Charkivo "
+    "gyvenamuosius kvartalus, sužeisti keli žmonės, apgadinti namai ir mokykla. "
+    "Ukrainos oro gynyba numušė dalį dronų, likusieji pataikė į energetikos "
+    "objektus. Gelbėtojai dirba įvykio vietoje. #Ukraina #Charkivas #karas #žinios"
+)
+
+
+def synthetic_rules(n, seed=1):
+    rnd = random.Random(seed)
+    words = set()
+    while len(words) < n:
+        words.add("".join(rnd.choice(LETTERS) for _ in range(rnd.randint(6, 12))))
+    return [Rule(id=f"gen-{w}", kind="banned", pattern=w,
+                 message=f"juodojo sąrašo frazė: /{w}/") for w in sorted(words)]
+
+
+def per_call_us(fn, repeat=REPEAT):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    base = translate_pipeline.RULES.rules
+    print(f"{'taisyklių':>10} {'naive µs':>10} {'engine µs':>10} {'batch µs/t':>11} "
+          f"{'kompiliavimas ms':>17}")
+    for n in RULE_COUNTS:
+        rules = base + synthetic_rules(n)
+
+        started = time.perf_counter()
+        engine = RuleEngine(rules)
+        compile_ms = (time.perf_counter() - started) * 1000
+
+        naive_patterns = [re.compile(r.pattern, re.I) for r in rules]
+        naive = per_call_us(lambda: [p.search(SAMPLE) for p in naive_patterns],
+                            repeat=max(5, REPEAT // (1 + n // 500)))
+        scan = per_call_us(lambda: engine.scan(SAMPLE))
+        texts = [SAMPLE] * BATCH
+        batch = per_call_us(lambda: engine.scan_batch(texts), repeat=REPEAT // 10) / BATCH
+
+        print(f"{len(rules):>10} {naive:>10.1f} {scan:>10.1f} {batch:>11.1f} {compile_ms:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+# ====================================================================
+# VIETINIAI PAKAITALAI BENCHMARK'AMS (be tinklo ir be kredencialų)
+#
+#   FakeTelegram – N sugeneruotų postų kanalas (albumai, medijos dydžiai),
+#                  su get_messages / iter_messages / iter_download
+#   FsBucket     – GCS bucket'as, saugantis objektus vietiniame kataloge
+#   StubServer   – vietinis HTTP serveris vietoj DeepSeek ir Make webhook
+#                  (konfigūruojamas vėlavimas ir klaidų dažnis)
+#
+# Pakaitalai įdedami į main / translate_pipeline / outbox modulių
+# kintamuosius (main.client, main.bucket, DEEPSEEK_URL, MAKE_WEBHOOK_URL).
+# ====================================================================
+
+import os
+import json
+import time
+import zlib
+import random
+import asyncio
+import datetime
+import threading
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LT_POST = ("Naktį okupantai apšaudė Charkivo srities kaimus, sužeisti du žmonės. "
+           "Gelbėtojai gesino gaisrus ir padėjo gyventojams.\n\n#Ukraina #Charkivas #karas")
+
+SOURCE_TEXT = ("Вночі окупанти обстріляли села Харківщини, двоє людей поранені. "
+               "Рятувальники гасили пожежі та допомагали мешканцям. ") * 3
+
+
+# --------------------------------------------------------------------
+# TELEGRAM
+# --------------------------------------------------------------------
+class FakeFile:
+    def __init__(self, name, ext, size, mime_type, duration=None, width=None, height=None):
+        self.name, self.ext, self.size, self.mime_type = name, ext, size, mime_type
+        self.duration, self.width, self.height = duration, width, height
+
+
+class FakeMessage:
+    def __init__(self, msg_id, text, date, size, video=True, grouped_id=None):
+        self.id = msg_id
+        self.message = text
+        self.date = date
+        self.grouped_id = grouped_id
+        self.size = size
+        self.sticker = None
+        ident = types.SimpleNamespace(id=10_000_000 + msg_id)
+        self.photo = None if video else ident
+        self.document = ident if video else None
+        self.media = types.SimpleNamespace(grouped_id=grouped_id, document=self.document,
+                                           photo=self.photo, owner=self)
+        if video:
+            self.file = FakeFile(None, ".mp4", size, "video/mp4", 30.0, 1280, 720)
+        else:
+            self.file = FakeFile(None, ".jpg", size, "image/jpeg")
+
+    def payload(self):
+        # Kiekvieno failo turinys skirtingas - kitaip veiktų turinio dedup
+        head = f"media-{self.id}-".encode()
+        return head + b"\0" * max(0, self.size - len(head))
+
+    async def download_media(self, file, thumb=None):
+        if thumb is not None:
+            # Miniatiūra: Telethon rašo į nurodytą failo kelią
+            with open(file, "wb") as f:
+                f.write(b"\xff\xd8\xff\xe0" + b"\0" * 2048 + b"\xff\xd9")
+            return file
+        kind = "document" if self.document else "photo"
+        path = os.path.join(file, f"{kind}_{self.date.strftime('%Y-%m-%d_%H-%M-%S')}"
+                                  f"{self.file.ext}")
+        with open(path, "wb") as f:
+            f.write(self.payload())
+        return path
+
+
+def make_channel(n_posts, first_id=1000, album_every=5, album_size=3,
+                 video_size=2 * 1024 * 1024, photo_size=200 * 1024, start=None):
+    """N postų kanalas (naujausia žinutė - didžiausias ID). Kas album_every
+    postas - albumas: nuotrauka + (album_size - 1) video."""
+    start = start or datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=12)
+    messages = []
+    msg_id = first_id
+    for i in range(n_posts):
+        date = start + datetime.timedelta(minutes=i)
+        text = f"#{i} {SOURCE_TEXT}"
+        if album_every and i % album_every == album_every - 1:
+            grouped = 900_000 + i
+            messages.append(FakeMessage(msg_id, text, date, photo_size, video=False,
+                                        grouped_id=grouped))
+            for _ in range(album_size - 1):
+                msg_id += 1
+                messages.append(FakeMessage(msg_id, "", date, video_size, grouped_id=grouped))
+        else:
+            messages.append(FakeMessage(msg_id, text, date, video_size))
+        msg_id += 1
+    return messages
+
+
+class FakeTelegram:
+    """Telethon klientas be tinklo. rpc_latency - vienos užklausos vėlavimas."""
+
+    def __init__(self, channels, rpc_latency=0.02, page_size=100):
+        self.channels = channels  # {kanalas: [FakeMessage]}
+        self.rpc_latency = rpc_latency
+        self.page_size = page_size
+        self.requests = 0
+        self.bytes_sent = 0
+
+    async def _rpc(self):
+        self.requests += 1
+        if self.rpc_latency:
+            await asyncio.sleep(self.rpc_latency)
+
+    async def connect(self):
+        await self._rpc()
+
+    async def send_message(self, to, text):
+        await self._rpc()
+
+    async def get_messages(self, channel, limit):
+        await self._rpc()
+        return sorted(self.channels[channel], key=lambda m: -m.id)[:limit]
+
+    async def iter_messages(self, channel, min_id=0, reverse=False, limit=None):
+        found = sorted((m for m in self.channels[channel] if m.id > min_id),
+                       key=lambda m: m.id)[:limit]
+        for i, msg in enumerate(found):
+            if i % self.page_size == 0:
+                await self._rpc()
+            yield msg
+
+    async def iter_download(self, media, request_size=512 * 1024, **kwargs):
+        data = media.owner.payload()
+        for offset in range(0, len(data), request_size):
+            await self._rpc()
+            chunk = data[offset:offset + request_size]
+            self.bytes_sent += len(chunk)
+            yield chunk
+
+
+# --------------------------------------------------------------------
+# GCS
+# --------------------------------------------------------------------
+class FsWriter:
+    def __init__(self, blob):
+        self.blob = blob
+        self.tmp = blob.path + ".part"
+        self.f = open(self.tmp, "wb")
+
+    def write(self, data):
+        self.f.write(data)
+        return len(data)
+
+    def close(self):
+        self.f.close()
+        os.replace(self.tmp, self.blob.path)
+        self.blob.remember_metadata()
+
+    def terminate(self):
+        self.f.close()
+        if os.path.exists(self.tmp):
+            os.remove(self.tmp)
+
+
+class FsBlob:
+    def __init__(self, bucket, name, chunk_size=None):
+        self.bucket, self.name, self.chunk_size = bucket, name, chunk_size
+        self.path = os.path.join(bucket.root, name.replace("/", "__"))
+        self.content_type = None
+        self.cache_control = None
+        self.metadata = None
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def remember_metadata(self):
+        # Kaip GCS: metaduomenys galioja tik tie, kurie išsiųsti kuriant objektą
+        self.bucket.metadata[self.name] = {"content_type": self.content_type,
+                                           "cache_control": self.cache_control}
+
+    def upload_from_filename(self, filename, content_type=None, **kwargs):
+        self.content_type = content_type or self.content_type
+        with open(filename, "rb") as src, open(self.path, "wb") as dst:
+            dst.write(src.read())
+        self.remember_metadata()
+
+    def delete(self):
+        os.remove(self.path)
+        self.bucket.metadata.pop(self.name, None)
+
+    def open(self, mode, content_type=None, **kwargs):
+        return FsWriter(self)
+
+
+class FsBucket:
+    """GCS bucket'o pakaitalas: objektai - failai kataloge root."""
+
+    def __init__(self, root, name="telegram-media-storage"):
+        self.root, self.name = root, name
+        self.metadata = {}  # objekto vardas -> metaduomenys įkėlimo metu
+        os.makedirs(root, exist_ok=True)
+
+    def blob(self, name, chunk_size=None, **kwargs):
+        return FsBlob(self, name, chunk_size)
+
+    def get_blob(self, name):
+        blob = FsBlob(self, name)
+        return blob if blob.exists() else None
+
+    def copy_blob(self, blob, destination_bucket, new_name):
+        target = destination_bucket.blob(new_name)
+        with open(blob.path, "rb") as src, open(target.path, "wb") as dst:
+            dst.write(src.read())
+        destination_bucket.metadata[new_name] = dict(self.metadata.get(blob.name, {}))
+        return target
+
+    def bytes_stored(self):
+        return sum(os.path.getsize(os.path.join(self.root, f)) for f in os.listdir(self.root))
+
+
+# --------------------------------------------------------------------
+# DEEPSEEK + MAKE
+# --------------------------------------------------------------------
+class StubConfig:
+    def __init__(self, latency=0.05, error_rate=0.0, make_latency=0.02,
+                 make_error_rate=0.0, seed=1):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.make_latency = make_latency
+        self.make_error_rate = make_error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = {"deepseek": 0, "make": 0, "errors": 0}
+
+    def fail(self, rate):
+        with self.lock:
+            return self.random.random() < rate
+
+
+def _answer_for(system, user):
+    from translate_pipeline import ANALYZE_PROMPT, MERGED_PROMPT, REVIEW_PROMPT
+    # Rizika priklauso nuo teksto - dalis postų eina pilna grandine
+    risk = "low" if zlib.crc32(user.encode()) % 2 else "medium"
+    facts = "Apšaudyti Charkivo srities kaimai, sužeisti du žmonės."
+    if system.startswith(ANALYZE_PROMPT):
+        return {"facts": facts, "expressions": [], "risk": risk}
+    if system == MERGED_PROMPT:
+        return {"facts": facts, "expressions": [], "risk": risk, "post": LT_POST}
+    if system.startswith(REVIEW_PROMPT):
+        return {"ok": True, "problems": [], "final": LT_POST}
+    return LT_POST
+
+
+def _deepseek_answer(request):
+    from translate_pipeline import BATCH_SUFFIX
+    system = request["messages"][0]["content"]
+    user = request["messages"][-1]["content"]
+    if system.endswith(BATCH_SUFFIX):
+        items = json.loads(user)["items"]
+        return json.dumps({"results": [
+            dict(_answer_for(system, json.dumps(item, ensure_ascii=False)), id=item["id"])
+            for item in items]})
+    answer = _answer_for(system, user)
+    return answer if isinstance(answer, str) else json.dumps(answer)
+
+
+def _usage(request, text):
+    prompt = sum(len(m["content"]) for m in request["messages"]) // 4
+    return {"prompt_tokens": prompt, "completion_tokens": len(text) // 4,
+            "prompt_cache_hit_tokens": 0}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, kaip tikri API
+    config = None
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body=b"", content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        cfg = self.config
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.startswith("/make"):
+            cfg.calls["make"] += 1
+            time.sleep(cfg.make_latency)
+            if cfg.fail(cfg.make_error_rate):
+                cfg.calls["errors"] += 1
+                return self._reply(503, b"busy")
+            return self._reply(200, b"Accepted", "text/plain")
+
+        cfg.calls["deepseek"] += 1
+        time.sleep(cfg.latency)
+        if cfg.fail(cfg.error_rate):
+            cfg.calls["errors"] += 1
+            return self._reply(503, b'{"error": "overloaded"}')
+        request = json.loads(body)
+        text = _deepseek_answer(request)
+        if not request.get("stream"):
+            answer = {"choices": [{"message": {"content": text}}],
+                      "usage": _usage(request, text)}
+            return self._reply(200, json.dumps(answer).encode())
+
+        # SSE: tekstas keliais gabalais, paskutiniame - usage
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        step = max(1, len(text) // 8)
+        for i in range(0, len(text), step):
+            chunk = {"choices": [{"delta": {"content": text[i:i + step]}}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        tail = {"choices": [], "usage": _usage(request, text)}
+        self.wfile.write(f"data: {json.dumps(tail)}\n\ndata: [DONE]\n\n".encode())
+        self.close_connection = True
+
+
+class StubServer:
+    """Vietinis HTTP serveris: /deepseek (chat/completions) ir /make."""
+
+    def __init__(self, config):
+        handler = type("Handler", (_Handler,), {"config": config})
+        self.config = config
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
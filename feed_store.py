@@ -0,0 +1,221 @@
+# ====================================================================
+# RSS ĮRAŠŲ SAUGYKLA IR GENERAVIMAS
+#
+# docs/items.jsonl – vienas JSON įrašas eilutėje (ID, laikas, tekstas,
+# enclosure URL/tipas/dydis, video poster). Tai yra vienintelis RSS šaltinis: nauji
+# įrašai tik prirašomi failo gale, o rss.xml sugeneruojamas iš
+# naujausių įrašų vienu praėjimu, nebeparsinant seno rss.xml.
+#
+# Failas periodiškai suspaudžiamas (kompaktinimas), kad jo dydis ir
+# įkėlimo laikas neaugtų kartu su visa istorija.
+#
+# rss.xml generuojamas deterministiškai ir perrašomas tik pasikeitus
+# turiniui (hash be lastBuildDate): tada atnaujinama lastBuildDate, šalia
+# rašomas rss.xml.gz (mtime=0 - tie patys baitai) ir rss.xml.meta.json su
+# ETag/Last-Modified sąlyginėms užklausoms. Nepasikeitus - failai neliečiami,
+# todėl workflow neturi ką commit'inti.
+# ====================================================================
+
+import os
+import gzip
+import json
+import heapq
+import hashlib
+import logging
+import datetime
+import email.utils
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape, quoteattr
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+ITEMS_FILE = "docs/items.jsonl"
+ITEM_STORE_LIMIT = 500
+
+FEED_TITLE = "Latest news"
+FEED_LINK = "https://www.mandarinai.lt/"
+FEED_DESCRIPTION = "Naujienų kanalą pristato www.mandarinai.lt"
+POST_LINK = "https://www.mandarinai.lt/post/{}"
+FEED_META_SUFFIX = ".meta.json"
+
+
+def make_item(post_id, date, text, media=None, channel=None):
+    """Įrašas saugyklai iš Telegram žinutės duomenų ir medijos aprašo."""
+    item = {"id": str(post_id), "ts": date.timestamp(), "text": text or ""}
+    if channel:
+        item["channel"] = channel
+    if media:
+        item["enc"] = {"url": media["url"], "type": media["content_type"],
+                       "length": int(media["length"] or 0)}
+        if media.get("poster_url"):
+            item["poster"] = media["poster_url"]
+    return item
+
+
+def load_items(path=ITEMS_FILE):
+    """Grąžina {id: įrašas}; vėlesnė eilutė perrašo ankstesnę."""
+    items = {}
+    if not os.path.exists(path):
+        return items
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                logger.error(f"❌ {path}: sugadinta eilutė praleidžiama")
+                continue
+            items[item["id"]] = item
+    return items
+
+
+def _line_count(path):
+    with open(path, "rb") as f:
+        return sum(1 for _ in f)
+
+
+def append_items(new_items, path=ITEMS_FILE, limit=ITEM_STORE_LIMIT):
+    if not new_items:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for item in new_items:
+            f.write(json.dumps(item, ensure_ascii=False, sort_keys=True) + "\n")
+    if _line_count(path) > 2 * limit:
+        compact(path, limit)
+
+
+def compact(path=ITEMS_FILE, limit=ITEM_STORE_LIMIT):
+    items = newest(load_items(path), limit)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for item in reversed(items):
+            f.write(json.dumps(item, ensure_ascii=False, sort_keys=True) + "\n")
+    os.replace(tmp, path)
+    logger.info(f"🗜️ {path} suspaustas iki {len(items)} įrašų")
+
+
+def newest(items, n):
+    return heapq.nlargest(n, items.values(), key=lambda i: (i["ts"], i["id"]))
+
+
+def migrate_from_rss(rss_path, path=ITEMS_FILE):
+    """Vienkartinis perkėlimas: seno rss.xml įrašai -> saugykla (su medija)."""
+    if os.path.exists(path) or not os.path.exists(rss_path):
+        return
+    try:
+        channel = ET.parse(rss_path).getroot().find("channel")
+    except Exception as e:
+        logger.error(f"❌ RSS failas sugadintas, perkelti nepavyko: {e}")
+        return
+    items = []
+    for node in channel.findall("item") if channel is not None else []:
+        link = node.findtext("link") or ""
+        post_id = link.rstrip("/").rsplit("/", 1)[-1]
+        try:
+            date = email.utils.parsedate_to_datetime(node.findtext("pubDate"))
+        except Exception:
+            continue
+        enclosure = node.find("enclosure")
+        media = None
+        if enclosure is not None and enclosure.get("url"):
+            media = {"url": enclosure.get("url"), "content_type": enclosure.get("type"),
+                     "length": enclosure.get("length")}
+        items.append(make_item(post_id, date, node.findtext("description"), media))
+    items.sort(key=lambda i: i["ts"])
+    append_items(items, path)
+    logger.info(f"📦 Į {path} perkelta {len(items)} įrašų iš {rss_path}")
+
+
+def _rfc822(ts):
+    return email.utils.format_datetime(
+        datetime.datetime.fromtimestamp(ts, tz=datetime.timezone.utc))
+
+
+def _write_atomic(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def load_feed_meta(rss_path):
+    try:
+        with open(rss_path + FEED_META_SUFFIX, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _render_parts(items, title):
+    """(antraštė, įrašai) be lastBuildDate - iš jų skaičiuojamas turinio hash."""
+    head = [
+        "<?xml version='1.0' encoding='UTF-8'?>\n",
+        '<rss xmlns:atom="http://www.w3.org/2005/Atom" '
+        'xmlns:content="http://purl.org/rss/1.0/modules/content/" '
+        'xmlns:media="http://search.yahoo.com/mrss/" version="2.0">\n',
+        "  <channel>\n",
+        f"    <title>{escape(title)}</title>\n",
+        f"    <link>{escape(FEED_LINK)}</link>\n",
+        f"    <description>{escape(FEED_DESCRIPTION)}</description>\n",
+        "    <docs>http://www.rssboard.org/rss-specification</docs>\n",
+        "    <generator>telegram-rss-feed</generator>\n",
+    ]
+    body = []
+    seen_media = set()
+    for item in items:
+        text = item["text"]
+        body.append("    <item>\n")
+        body.append(f"      <title>{escape(text[:30] if text else 'No Title')}</title>\n")
+        body.append(f"      <link>{escape(POST_LINK.format(item['id']))}</link>\n")
+        body.append(f"      <description>{escape(text if text else 'No Content')}</description>\n")
+        enc = item.get("enc")
+        # Ta pati medija (albumai) prisegama tik prie naujausio įrašo
+        if enc and enc["url"] not in seen_media:
+            seen_media.add(enc["url"])
+            body.append(f"      <enclosure url={quoteattr(enc['url'])} "
+                        f"length={quoteattr(str(enc['length']))} "
+                        f"type={quoteattr(enc['type'] or '')}/>\n")
+            if item.get("poster"):
+                body.append(f"      <media:thumbnail url={quoteattr(item['poster'])}/>\n")
+        body.append(f"      <pubDate>{_rfc822(item['ts'])}</pubDate>\n")
+        body.append("    </item>\n")
+    body.append("  </channel>\n")
+    body.append("</rss>\n")
+    return "".join(head), "".join(body)
+
+
+def render_rss(items, rss_path, build_date=None, title=FEED_TITLE):
+    """Rašo rss.xml (+ .gz ir .meta.json) iš įrašų (naujausias pirmas), jei
+    turinys pasikeitė. Grąžina True - perrašyta, False - nepasikeitė."""
+    head, body = _render_parts(items, title)
+    content_hash = hashlib.sha256((head + body).encode("utf-8")).hexdigest()
+    gz_path = rss_path + ".gz"
+    if (load_feed_meta(rss_path).get("content_hash") == content_hash
+            and os.path.exists(rss_path) and os.path.exists(gz_path)):
+        metrics.count("feed.unchanged")
+        return False
+
+    build_date = build_date or datetime.datetime.now(datetime.timezone.utc)
+    data = (head + f"    <lastBuildDate>{email.utils.format_datetime(build_date)}</lastBuildDate>\n"
+            + body).encode("utf-8")
+    _write_atomic(rss_path, data)
+    _write_atomic(gz_path, gzip.compress(data, compresslevel=9, mtime=0))
+    meta = {
+        "content_hash": content_hash,
+        "etag": f'"{hashlib.sha256(data).hexdigest()[:32]}"',
+        "last_modified": email.utils.format_datetime(
+            build_date.astimezone(datetime.timezone.utc), usegmt=True),
+        "length": len(data),
+        "gzip_length": os.path.getsize(gz_path),
+    }
+    _write_atomic(rss_path + FEED_META_SUFFIX,
+                  (json.dumps(meta, indent=1, sort_keys=True) + "\n").encode("utf-8"))
+    metrics.count("feed.rewritten")
+    logger.info(f"📝 {rss_path} perrašytas ({len(items)} įrašų, {len(data) / 1024:.0f} KB, "
+                f"gzip {meta['gzip_length'] / 1024:.0f} KB)")
+    return True
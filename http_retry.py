@@ -0,0 +1,63 @@
+# ====================================================================
+# HTTP KLIENTAI IR PAKARTOJIMAI (DeepSeek, Make)
+#
+# Vienas bendras asinchroninis klientas (keep-alive jungčių telkinys)
+# kiekvienam event loop'ui; pakartojimai - eksponentinis laukimas su
+# atsitiktiniu "jitter" ir Retry-After paisymu (429/503).
+# ====================================================================
+
+import time
+import random
+import asyncio
+import email.utils
+import httpx
+
+
+class ClientPool:
+    """httpx.AsyncClient kiekvienam event loop'ui (tarp paleidimų ir
+    demono ciklų jungtys lieka atviros)."""
+
+    def __init__(self, timeout, limits):
+        self.timeout = timeout
+        self.limits = limits
+        self._clients = {}
+
+    def get(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+            self._clients[loop] = client
+        return client
+
+    async def aclose(self):
+        """Uždaro šio event loop'o klientą (paleidimo pabaigoje)."""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+def retry_after_seconds(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+        return max(0.0, when.timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def backoff_delay(attempt, base, cap, retry_after=None, retry_after_max=120.0):
+    if retry_after is not None:
+        return min(retry_after, retry_after_max)
+    # "Full jitter": atsitiktinai tarp 0 ir eksponentinės ribos
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+def is_retryable(status_code):
+    return status_code in (408, 429) or status_code >= 500
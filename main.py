@@ -1,19 +1,24 @@
+import time
+
+_STARTED = time.perf_counter()
+
 import asyncio
 import os
+import sys
 import json
-import time
+import hashlib
+import shutil
 import logging
-import xml.etree.ElementTree as ET
-import datetime
-import email.utils
-import requests
-from feedgen.feed import FeedGenerator
-from google.cloud import storage
-from google.oauth2 import service_account
-from telethon import TelegramClient
-from telethon.sessions import StringSession
+import tempfile
+import importlib
+from typing import NamedTuple
 
-import translate_pipeline  # 3 pakopų vertimas + saugiklis
+import metrics  # pakopų laikai, skaitikliai, docs/run_report.json
+import feed_store  # RSS įrašų saugykla + rss.xml generavimas
+import state_store  # checkpoint'ai, paskelbti postai, eilė (SQLite)
+import scheduler  # skelbimo slotai, tylos valandos, prioritetai
+import media_upload  # GCS: turinio vardai, metaduomenys, lygiagretus įkėlimas
+import media_postprocess  # video faststart + poster (ffmpeg, jei yra)
 
 # ====================================================================
 # LOGŲ KONFIGŪRACIJA
@@ -21,92 +26,263 @@ import translate_pipeline  # 3 pakopų vertimas + saugiklis
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# ====================================================================
+# PALEIDIMO LAIKAS
+# Sunkios bibliotekos (telethon, google-cloud-storage, httpx)
+# importuojamos tik tada, kai jų prireikia, o kiekvieno importo trukmė
+# patenka į docs/run_report.json ("startup" skyrius). Taip matoma, kiek
+# kainuoja "tuščias" paleidimas (kai naujų postų nėra).
+# ====================================================================
+STARTUP = {"imports_ms": {}, "marks_ms": {}}
+
+
+def _ms_since_start():
+    return round((time.perf_counter() - _STARTED) * 1000, 1)
+
+
+def timed_import(name):
+    if name in sys.modules:
+        return sys.modules[name]
+    t0 = time.perf_counter()
+    module = importlib.import_module(name)
+    STARTUP["imports_ms"][name] = round((time.perf_counter() - t0) * 1000, 1)
+    return module
+
+
+def startup_mark(name):
+    """Pažymi paleidimo etapą (tik pirmą kartą) - ms nuo proceso pradžios."""
+    STARTUP["marks_ms"].setdefault(name, _ms_since_start())
+
+
+def report_startup():
+    startup_mark("finished")
+    imports = STARTUP["imports_ms"]
+    details = ", ".join(f"{k} {v:.0f}" for k, v in imports.items()) or "nėra"
+    logger.info(f"⏱️ Paleidimas: main importas {STARTUP['module_ms']:.0f} ms, "
+                f"pirma Telegram užklausa po "
+                f"{STARTUP['marks_ms'].get('first_telegram_request', 0):.0f} ms, "
+                f"vėlesni importai (ms): {details}")
+
+
 # ====================================================================
 # TELEGRAM PRISIJUNGIMO DUOMENYS
+# (klientas kuriamas tik pirmą kartą prireikus - modulį galima importuoti
+# ir be aplinkos kintamųjų)
 # ====================================================================
-api_id = int(os.getenv("TELEGRAM_API_ID"))
-api_hash = os.getenv("TELEGRAM_API_HASH")
-string_session = os.getenv("TELEGRAM_STRING_SESSION")
-client = TelegramClient(StringSession(string_session), api_id, api_hash)
+client = None
+
+
+def get_client():
+    global client
+    if client is None:
+        telethon = timed_import("telethon")
+        sessions = timed_import("telethon.sessions")
+        api_id = int(os.getenv("TELEGRAM_API_ID"))
+        api_hash = os.getenv("TELEGRAM_API_HASH")
+        string_session = os.getenv("TELEGRAM_STRING_SESSION")
+        client = telethon.TelegramClient(sessions.StringSession(string_session),
+                                         api_id, api_hash)
+    return client
+
 
 # ====================================================================
 # GOOGLE CLOUD STORAGE KONFIGŪRACIJA
+# (bucket kuriamas tik tada, kai yra medijos įkėlimui)
 # ====================================================================
-credentials_json = os.getenv("GCP_SERVICE_ACCOUNT_JSON")
-if not credentials_json:
-    raise Exception("❌ Google Cloud kredencialai nerasti!")
-credentials_dict = json.loads(credentials_json)
-credentials = service_account.Credentials.from_service_account_info(credentials_dict)
-storage_client = storage.Client(credentials=credentials)
 bucket_name = "telegram-media-storage"
-bucket = storage_client.bucket(bucket_name)
+bucket = None
+
+
+def get_bucket():
+    global bucket
+    if bucket is None:
+        if media_upload.EMULATOR_HOST:
+            # Vietinis GCS emuliatorius - be kredencialų, bucket'as sukuriamas
+            storage = timed_import("google.cloud.storage")
+            auth = timed_import("google.auth.credentials")
+            storage_client = storage.Client(project="local",
+                                            credentials=auth.AnonymousCredentials())
+            bucket = storage_client.bucket(bucket_name)
+            if not bucket.exists():
+                storage_client.create_bucket(bucket_name)
+            return bucket
+        credentials_json = os.getenv("GCP_SERVICE_ACCOUNT_JSON")
+        if not credentials_json:
+            raise Exception("❌ Google Cloud kredencialai nerasti!")
+        service_account = timed_import("google.oauth2.service_account")
+        storage = timed_import("google.cloud.storage")
+        credentials_dict = json.loads(credentials_json)
+        credentials = service_account.Credentials.from_service_account_info(credentials_dict)
+        storage_client = storage.Client(credentials=credentials)
+        bucket = storage_client.bucket(bucket_name)
+    return bucket
+
+
+def pipeline():
+    """translate_pipeline (httpx, taisyklių variklis) - tik kai reikia versti."""
+    return timed_import("translate_pipeline")
+
+
+def make_outbox():
+    """outbox (Make siuntimai per httpx) - tik kai yra ką siųsti."""
+    return timed_import("outbox")
+
+
+async def close_http_clients():
+    for name in ("translate_pipeline", "outbox"):
+        if name in sys.modules:
+            await sys.modules[name].aclose()
 
 # ====================================================================
 # KONSTANTOS
 # ====================================================================
-LAST_POST_FILE = "docs/last_post.json"
+# Sekami kanalai (TELEGRAM_CHANNELS="kanalas1,kanalas2,..."). Pirmojo
+# istorinio kanalo postų ID ir checkpoint'as lieka be kanalo prefikso,
+# kad sutaptų su jau paskelbtais postais ir senomis nuorodomis.
+LEGACY_CHANNEL = 'Tsaplienko'
+CHANNELS = [c.strip() for c in os.getenv("TELEGRAM_CHANNELS", LEGACY_CHANNEL).split(",")
+            if c.strip()]
 RSS_FILE = "docs/rss.xml"
-MAX_POSTS = 7
+# Atskiri kiekvieno kanalo feed'ai (docs/rss-<kanalas>.xml) šalia bendro
+CHANNEL_FEEDS = os.getenv("CHANNEL_FEEDS", "0") == "1"
+CHANNEL_RSS_FILE = "docs/rss-{}.xml"
+MAX_POSTS = int(os.getenv("FEED_MAX_ITEMS", "7"))  # kiek naujausių įrašų rodoma rss.xml
 MAX_MEDIA_SIZE = 30 * 1024 * 1024
 
-MAKE_WEBHOOK_URL = os.getenv("MAKE_WEBHOOK_URL")
-SENT_FILE = "docs/sent_to_make.json"
-LAST_SENT_FILE = "docs/last_sent.json"
-SENT_HISTORY_LIMIT = 200
+# Inkrementinis gavimas: imamos tik žinutės, naujesnės nei išsaugotas
+# checkpoint'as. Be checkpoint'o (pirmas paleidimas) - paskutinės FETCH_LIMIT.
+INCREMENTAL_FETCH = os.getenv("INCREMENTAL_FETCH", "1") == "1"
+FETCH_LIMIT = 14
+MAX_FETCH_BACKLOG = 200
+# Tiek paleidimų iš eilės nepavykus medijai, checkpoint'as postą praleidžia
+# (kitaip vienas "amžinai" klaidingas failas sustabdytų visą kanalą)
+MEDIA_MAX_FAILURES = int(os.getenv("MEDIA_MAX_FAILURES", "3"))
+FLOOD_WAIT_MAX_SECONDS = 10 * 60
+# Kiek kanalų vienu metu skaitoma iš Telegram (bendras visų kanalų biudžetas)
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "4"))
+
+# Išankstinis vertimas: kol valandinė riba neleidžia skelbti, kelios eilės
+# pradžios video verčiami iš anksto, o vertimas saugomas eilės įraše
+PRETRANSLATE_AHEAD = int(os.getenv("PRETRANSLATE_AHEAD", "3"))
+PRETRANSLATE_CONCURRENCY = int(os.getenv("PRETRANSLATE_CONCURRENCY", "2"))
+# Paketiniame vertimo režime (TRANSLATE_BATCH=1) - kiek video verčiama kartu
+PRETRANSLATE_BATCH_AHEAD = int(os.getenv("PRETRANSLATE_BATCH_AHEAD", "8"))
 
-# Postinimo dažnio riba: ne dažniau kaip 1 postas per valandą
-MIN_INTERVAL_SECONDS = 60 * 60
+# Demono režimas: atsarginis naujų postų patikrinimas ir albumų laukimas
+DAEMON_POLL_SECONDS = 15 * 60
+DAEMON_DEBOUNCE_SECONDS = 3
+# Demonas pats commit'ina ir push'ina docs/ (rss.xml, state.db) - kaip cron
+# workflow, tik iškart po pakeitimo
+DAEMON_GIT_PUSH = os.getenv("DAEMON_GIT_PUSH", "1") == "1"
+DAEMON_GIT_REMOTE = os.getenv("DAEMON_GIT_REMOTE", "origin")
+DAEMON_GIT_BRANCH = os.getenv("DAEMON_GIT_BRANCH", "main")
+DAEMON_PUSH_ATTEMPTS = 3
+# Demono "nuoma" state.db: kol ji galioja, cron paleidimas nieko nedaro
+# (kitaip abu siųstų tą pačią eilę į Make). Pratęsiama likus pusei laiko.
+DAEMON_LEASE_SECONDS = int(os.getenv("DAEMON_LEASE_SECONDS", str(2 * 60 * 60)))
+# Be git publikavimo nuoma cron'o checkout'o nepasiekia - demonas nestartuoja,
+# nebent operatorius patvirtina, kad cron išjungtas (FEED_DAEMON=1)
+DAEMON_STANDALONE = os.getenv("DAEMON_STANDALONE", "0") == "1"
+# Tik šie failai pasikeitę - commit'o nereikia (kaip workflow)
+DOCS_REPORT_FILES = ("docs/run_report.json", "docs/run_history.json", "docs/metrics.prom")
+
+# Medijos indeksas: Telegram photo/document ID ir turinio sha256 -> GCS blob
+MEDIA_INDEX_FILE = "docs/media_index.json"
+MEDIA_INDEX_LIMIT = 2000
 
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 
+# Medijos konvejerio lygiagretumas: kiek failų vienu metu siunčiamės iš
+# Telegram ir kiek vienu metu keliam į GCS
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "3"))
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "2"))
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.mkv', '.avi', '.wmv', '.flv', '.webm')
+
+# Srautinis režimas: medija iš Telegram (iter_download) keliauja tiesiai į
+# GCS resumable upload sesiją, be laikino failo diske. Atmintyje vienu metu
+# laikomas tik vienas GCS gabalas (kartotinis 256 KB).
+MEDIA_STREAMING = os.getenv("MEDIA_STREAMING", "1") == "1"
+STREAM_CHUNK_SIZE = 8 * 1024 * 1024
+STREAM_REQUEST_SIZE = 512 * 1024
+
 
 # ====================================================================
 # BŪSENOS FAILAI
+# (checkpoint, paskelbti postai ir eilė - state_store.StateStore)
 # ====================================================================
-def load_last_post():
-    if os.path.exists(LAST_POST_FILE):
-        with open(LAST_POST_FILE, "r") as f:
-            return json.load(f)
-    return {"id": 0}
+def load_media_index():
+    if os.path.exists(MEDIA_INDEX_FILE):
+        try:
+            with open(MEDIA_INDEX_FILE, "r") as f:
+                index = json.load(f)
+            index.setdefault("by_media", {})
+            index.setdefault("by_hash", {})
+            index["dirty"] = False
+            return index
+        except Exception as e:
+            logger.error(f"❌ {MEDIA_INDEX_FILE} sugadintas, kuriamas naujas: {e}")
+    return {"by_media": {}, "by_hash": {}, "dirty": False}
 
 
-def save_last_post(post_data):
-    os.makedirs("docs", exist_ok=True)
-    with open(LAST_POST_FILE, "w") as f:
-        json.dump(post_data, f)
+def remember_media(index, key, entry):
+    if key and index["by_media"].get(key) != entry:
+        index["by_media"][key] = entry
+        index["dirty"] = True
+    if entry.get("sha256") and entry["sha256"] not in index["by_hash"]:
+        index["by_hash"][entry["sha256"]] = entry
+        index["dirty"] = True
 
 
-def load_sent_ids():
-    if os.path.exists(SENT_FILE):
-        try:
-            with open(SENT_FILE, "r") as f:
-                return list(json.load(f))
-        except Exception as e:
-            logger.error(f"❌ {SENT_FILE} sugadintas, kuriamas naujas: {e}")
-    return []
+def claim_hash(index, digest):
+    # Turinio hash pažymimas "keliamu" dar prieš įkėlimą: lygiagretus
+    # konvejeris su tuo pačiu turiniu laukia šio įkėlimo rezultato, o ne
+    # pasiima įrašą, kurio objektas gal niekada nebus įkeltas
+    claim = asyncio.get_running_loop().create_future()
+    index.setdefault("pending", {})[digest] = claim
+    return claim
 
 
-def save_sent_ids(ids):
-    os.makedirs("docs", exist_ok=True)
-    with open(SENT_FILE, "w") as f:
-        json.dump(ids[-SENT_HISTORY_LIMIT:], f)
+def settle_hash(index, digest, claim, entry):
+    """Įkėlimo rezultatas laukiantiems: entry - įkelta, None - nepavyko."""
+    pending = index.setdefault("pending", {})
+    if pending.get(digest) is claim:
+        del pending[digest]
+    if entry is not None and digest not in index["by_hash"]:
+        index["by_hash"][digest] = entry
+        index["dirty"] = True
+    if not claim.done():
+        claim.set_result(entry)
 
 
-def load_last_sent_ts():
-    if os.path.exists(LAST_SENT_FILE):
-        try:
-            with open(LAST_SENT_FILE, "r") as f:
-                return float(json.load(f).get("ts", 0))
-        except Exception:
-            return 0.0
-    return 0.0
+def hash_known(index, digest):
+    """Turinys jau įkeltas arba šiuo metu keliamas kito posto."""
+    return digest in index["by_hash"] or digest in index.setdefault("pending", {})
 
 
-def save_last_sent_ts(ts):
+async def await_duplicate(index, digest):
+    """Jau įkeltas tas pats turinys arba None. Jei jį dar kelia kitas postas -
+    laukiama; jam nepavykus, grąžinama None ir keliama pačių."""
+    while True:
+        claim = index.setdefault("pending", {}).get(digest)
+        if claim is None:
+            return index["by_hash"].get(digest)
+        entry = await asyncio.shield(claim)
+        if entry is not None:
+            return entry
+
+
+def save_media_index(index):
+    if not index["dirty"]:
+        return
+    # Seniausi įrašai (įterpimo tvarka) išmetami virš ribos
+    for table in ("by_media", "by_hash"):
+        items = list(index[table].items())[-MEDIA_INDEX_LIMIT:]
+        index[table] = dict(items)
     os.makedirs("docs", exist_ok=True)
-    with open(LAST_SENT_FILE, "w") as f:
-        json.dump({"ts": ts,
-                   "utc": datetime.datetime.utcfromtimestamp(ts).isoformat()}, f)
+    with open(MEDIA_INDEX_FILE, "w") as f:
+        json.dump({"by_media": index["by_media"], "by_hash": index["by_hash"]}, f)
+    index["dirty"] = False
 
 
 # ====================================================================
@@ -115,200 +291,743 @@ def save_last_sent_ts(ts):
 async def notify(text):
     logger.warning(text)
     try:
-        await client.send_message("me", text)
+        await get_client().send_message("me", text)
     except Exception as e:
         logger.error(f"❌ Nepavyko išsiųsti pranešimo į Telegram: {e}")
 
 
 # ====================================================================
-# SIUNTIMAS Į MAKE
+# MEDIJOS KONVEJERIS: parsisiuntimas -> patikra -> įkėlimas
 # ====================================================================
-def send_to_make(payload):
-    if not MAKE_WEBHOOK_URL:
-        logger.warning("⚠️ MAKE_WEBHOOK_URL nenustatytas - webhook praleidžiamas")
-        return False
+def content_type_for(name):
+    if name.lower().endswith(VIDEO_EXTENSIONS):
+        return 'video/mp4'
+    return 'image/jpeg'
+
+
+def media_blob_name(msg):
+    # Toks pat vardas, kokį download_media(file="./") duotų Telethon
+    # (logams ir plėtiniui; GCS objekto vardas - turinio hash)
+    if msg.file.name:
+        return os.path.basename(msg.file.name)
+    kind = 'photo' if msg.photo else 'document'
+    return f"{kind}_{msg.date.strftime('%Y-%m-%d_%H-%M-%S')}{msg.file.ext or ''}"
+
+
+def media_key(msg):
+    """Telegram medijos ID indeksui (photo:<id> / document:<id>) arba None."""
+    if getattr(msg, "photo", None) is not None:
+        return f"photo:{msg.photo.id}"
+    if getattr(msg, "document", None) is not None:
+        return f"document:{msg.document.id}"
+    return None
+
+
+def media_result(entry):
+    result = {
+        "blob_name": entry["blob"],
+        "url": media_upload.public_url(bucket_name, entry["blob"]),
+        "content_type": entry["content_type"],
+        "length": entry["size"],
+    }
+    if entry.get("poster"):
+        result["poster_url"] = media_upload.public_url(bucket_name, entry["poster"])
+    return result
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+async def download_stage(msg, download_sem):
+    # Kiekvienas failas į atskirą laikiną katalogą, kad lygiagretūs
+    # parsisiuntimai nesusipjautų dėl vienodų Telethon failų vardų
+    workdir = tempfile.mkdtemp(prefix="media_", dir=".")
+    async with download_sem:
+        with metrics.timer("media.download"):
+            media_path = await msg.download_media(file=workdir)
+    if media_path and os.path.exists(media_path):
+        metrics.count("media.bytes_downloaded", os.path.getsize(media_path))
+    return workdir, media_path
+
+
+def validate_stage(msg, media_path, content_type):
+    """Grąžina (kelias, content_type, dydis) arba None, jei failas netinka."""
+    if not media_path:
+        logger.warning(f"⚠️ Nepavyko parsisiųsti medijos iš post {msg.id}")
+        return None
+
+    # Metaduomenys dydį jau patikrino - tai tik apsauga, jei jie melavo
+    size = os.path.getsize(media_path)
+    if size > MAX_MEDIA_SIZE:
+        logger.info(f"❌ Didelis failas - {media_path}, praleidžiamas")
+        return None
+
+    return media_path, content_type, size
+
+
+def upload_blob(media_path, blob_name, content_type):
+    # Blokuojantys GCS kvietimai - vykdomi atskiroje gijoje (asyncio.to_thread)
+    if media_upload.upload_file(get_bucket(), media_path, blob_name, content_type):
+        logger.info(f"✅ Įkėlėme {blob_name} į Google Cloud Storage")
+        return True
+    logger.info(f"🔄 {blob_name} jau egzistuoja Google Cloud Storage")
+    return False
+
+
+async def upload_stage(media_path, blob_name, content_type, upload_sem, blob_locks):
+    # Tas pats turinys (tas pats vardas) keliamas tik vieną kartą - antras
+    # laukia ir pamato, kad blob jau yra
+    async with blob_locks.setdefault(blob_name, asyncio.Lock()):
+        async with upload_sem:
+            with metrics.timer("media.upload"):
+                uploaded = await asyncio.to_thread(upload_blob, media_path, blob_name,
+                                                   content_type)
+    if uploaded:
+        metrics.count("media.bytes_uploaded", os.path.getsize(media_path))
+    return blob_name
+
+
+async def stream_stage(msg, name, content_type, media_index, download_sem, upload_sem):
+    """Srautu perkelia mediją į GCS. Grąžina indekso įrašą arba None."""
+    writer = claim = None
     try:
-        r = requests.post(MAKE_WEBHOOK_URL, json=payload, timeout=30)
-        if 200 <= r.status_code < 300:
-            logger.info(f"📨 Nusiųsta į Make: post {payload['id']}")
-            return True
-        logger.error(f"❌ Make webhook atmetė ({r.status_code}): {r.text[:200]}")
-        return False
-    except Exception as e:
-        logger.error(f"❌ Nepavyko pasiekti Make webhook: {e}")
-        return False
+        async with download_sem, upload_sem:
+            staged, writer = await asyncio.to_thread(media_upload.open_staged, get_bucket(),
+                                                     content_type, STREAM_CHUNK_SIZE)
+            size = 0
+            sha = hashlib.sha256()
+            async for chunk in get_client().iter_download(msg.media,
+                                                          request_size=STREAM_REQUEST_SIZE):
+                size += len(chunk)
+                metrics.count("media.bytes_downloaded", len(chunk))
+                if size > MAX_MEDIA_SIZE:
+                    # Nutraukiam iškart - likusi failo dalis nebesiunčiama
+                    logger.info(f"❌ Didelis failas - {name} "
+                                f"(> {MAX_MEDIA_SIZE} B), nutraukiam")
+                    await asyncio.to_thread(writer.terminate)
+                    return None
+                sha.update(chunk)
+                await asyncio.to_thread(writer.write, chunk)
 
+            digest = sha.hexdigest()
+            blob_name = media_upload.blob_name_for(digest, os.path.splitext(name)[1])
+            # Dažniausias atvejis - toks turinys nežinomas ir niekas jo nekelia:
+            # užbaigiam iškart, neatleidę semaforų
+            if not hash_known(media_index, digest):
+                claim = claim_hash(media_index, digest)
+                writer, staging = None, writer  # toliau sesiją tvarko commit_staged
+                created = await asyncio.to_thread(media_upload.commit_staged, get_bucket(),
+                                                  staged, staging, blob_name)
 
-# ====================================================================
-# RSS PAGALBINĖS
-# ====================================================================
-def load_existing_rss():
-    if not os.path.exists(RSS_FILE):
-        return []
+        if claim is None:
+            # Tas pats turinys jau įkeltas - sesija atšaukiama prieš paskutinį
+            # gabalą, naujas objektas nesukuriamas. Jei jį dar kelia kitas
+            # postas - laukiama jo rezultato (be semaforų, kad jis galėtų baigti)
+            duplicate = await await_duplicate(media_index, digest)
+            if duplicate:
+                metrics.count("media.duplicates")
+                await asyncio.to_thread(writer.terminate)
+                logger.info(f"🗂️ {name} turinys jau yra kaip {duplicate['blob']}")
+                return duplicate
+            claim = claim_hash(media_index, digest)
+            writer, staging = None, writer
+            async with upload_sem:
+                created = await asyncio.to_thread(media_upload.commit_staged, get_bucket(),
+                                                  staged, staging, blob_name)
+    except BaseException:
+        if claim is not None:
+            settle_hash(media_index, digest, claim, None)
+        # Nebaigta resumable sesija atšaukiama - GCS neliks pusinio objekto
+        if writer is not None:
+            try:
+                await asyncio.to_thread(writer.terminate)
+            except Exception as e:
+                logger.warning(f"⚠️ Nepavyko atšaukti GCS sesijos {name}: {e}")
+        raise
+
+    entry = {"blob": blob_name, "size": size,
+             "content_type": content_type, "sha256": digest}
+    settle_hash(media_index, digest, claim, entry)
+    if created:
+        metrics.count("media.bytes_uploaded", size)
+        logger.info(f"✅ Įkėlėme {name} į Google Cloud Storage kaip {blob_name} (srautu)")
+    else:
+        logger.info(f"🔄 {name} turinys jau yra Google Cloud Storage ({blob_name})")
+    return entry
+
+
+async def attach_poster(msg, video_path, entry, upload_sem, blob_locks):
+    """Poster JPEG šalia video (entry["poster"]). Nepavykus - video be jo."""
+    workdir = tempfile.mkdtemp(prefix="poster_", dir=".")
     try:
-        tree = ET.parse(RSS_FILE)
-        root = tree.getroot()
-        channel = root.find("channel")
-        return channel.findall("item") if channel is not None else []
+        with metrics.timer("media.poster"):
+            poster_path = await media_postprocess.poster(video_path, workdir, msg)
+        if poster_path:
+            digest = await asyncio.to_thread(file_sha256, poster_path)
+            poster_blob = media_upload.blob_name_for(digest, ".jpg")
+            await upload_stage(poster_path, poster_blob, "image/jpeg", upload_sem, blob_locks)
+            entry["poster"] = poster_blob
     except Exception as e:
-        logger.error(f"❌ RSS failas sugadintas, kuriamas naujas: {e}")
-        return []
+        logger.warning(f"⚠️ Poster post {msg.id} nepavyko: {e}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return entry
 
 
-def get_datetime(date_val):
-    if isinstance(date_val, datetime.datetime):
-        return date_val
+async def process_streamed_media(msg, content_type, media_index,
+                                 download_sem, upload_sem, blob_locks):
+    with metrics.timer("media.stream"):
+        entry = await stream_stage(msg, media_blob_name(msg), content_type, media_index,
+                                   download_sem, upload_sem)
+    # Srautu keliamo video failo diske nėra - poster tik iš Telegram miniatiūros
+    if entry and content_type.startswith("video/") and not entry.get("poster"):
+        await attach_poster(msg, None, entry, upload_sem, blob_locks)
+    return entry
+
+
+async def process_downloaded_media(msg, content_type, media_index,
+                                   download_sem, upload_sem, blob_locks):
+    workdir = None
+    try:
+        workdir, media_path = await download_stage(msg, download_sem)
+        checked = validate_stage(msg, media_path, content_type)
+        if not checked:
+            return None
+        media_path, content_type, size = checked
+
+        if content_type.startswith("video/"):
+            media_path = await media_postprocess.faststart(media_path, workdir)
+            size = os.path.getsize(media_path)
+
+        digest = await asyncio.to_thread(file_sha256, media_path)
+        duplicate = await await_duplicate(media_index, digest)
+        if duplicate:
+            metrics.count("media.duplicates")
+            logger.info(f"🗂️ {os.path.basename(media_path)} turinys jau yra "
+                        f"kaip {duplicate['blob']}")
+            return duplicate
+
+        blob_name = media_upload.blob_name_for(digest, os.path.splitext(media_path)[1])
+        entry = {"blob": blob_name, "size": size,
+                 "content_type": content_type, "sha256": digest}
+        claim = claim_hash(media_index, digest)
+        try:
+            await upload_stage(media_path, blob_name, content_type, upload_sem, blob_locks)
+        except BaseException:
+            settle_hash(media_index, digest, claim, None)
+            raise
+        settle_hash(media_index, digest, claim, entry)
+        if content_type.startswith("video/"):
+            await attach_poster(msg, media_path, entry, upload_sem, blob_locks)
+        return entry
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def process_media(post, media_index, failed_ids, download_sem, upload_sem, blob_locks):
+    """Grąžina medijos aprašą (url, tipas, dydis) arba None."""
+    if post.meta is None:
+        return None  # atranka mediją atmetė (per didelė / netinkamo tipo)
+
+    # Jau apdorota medija - enclosure imamas iš indekso, Telegram neliečiam
+    msg = post.msg
+    key = media_key(msg)
+    if key and key in media_index["by_media"]:
+        metrics.count("media.index_hits")
+        return media_result(media_index["by_media"][key])
+
+    content_type = post.meta["mime"]
     try:
-        return email.utils.parsedate_to_datetime(date_val)
-    except Exception:
-        return datetime.datetime.min
+        # Faststart perrašo failą diske - tokie video keliauja per laikiną failą
+        if MEDIA_STREAMING and not media_postprocess.wants_local_file(content_type):
+            entry = await process_streamed_media(msg, content_type, media_index,
+                                                 download_sem, upload_sem, blob_locks)
+        else:
+            entry = await process_downloaded_media(msg, content_type, media_index,
+                                                   download_sem, upload_sem, blob_locks)
+    except Exception as e:
+        metrics.count("media.errors")
+        logger.error(f"❌ Klaida apdorojant mediją iš post {msg.id}: {e}")
+        # Į checkpoint'ą patenka viso posto (albumo pradžios) ID
+        failed_ids.add(post.id)
+        return None
+
+    if not entry:
+        return None
+    remember_media(media_index, key, entry)
+    return media_result(entry)
+
+
+async def process_all_media(valid_posts, media_index, failed_ids):
+    # Visi postai leidžiami lygiagrečiai (ribojama semaforais), o rezultatai
+    # grąžinami ta pačia tvarka kaip valid_posts
+    download_sem = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+    upload_sem = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+    blob_locks = {}
+    # Bucket sukuriamas čia (įvykių cikle), o ne lenktyniaujant gijose
+    get_bucket()
+    return await asyncio.gather(*(
+        process_media(post, media_index, failed_ids.setdefault(post.channel, set()),
+                      download_sem, upload_sem, blob_locks)
+        for post in valid_posts
+    ))
+
+
+# ====================================================================
+# ŽINUČIŲ GAVIMAS
+# ====================================================================
+def checkpoint_channel(channel):
+    """Kanalo raktas būsenoje: istorinis kanalas - senasis raktas (None)."""
+    return None if channel == LEGACY_CHANNEL else channel
+
+
+def post_uid(channel, message_id):
+    """Posto ID feed'e, eilėje ir paskelbtų sąraše (unikalus tarp kanalų)."""
+    if channel == LEGACY_CHANNEL:
+        return str(message_id)
+    # Telegram vardai neturi '-', todėl ID negali sutapti tarp kanalų
+    return f"{channel}-{message_id}"
+
+
+class TelegramBudget:
+    """Bendras Telegram užklausų biudžetas visiems kanalams.
+
+    Lygiagrečiai skaitomi ne daugiau kaip FETCH_CONCURRENCY kanalų, o gavus
+    FloodWait viename kanale, pauzę daro visi - kitaip kiti kanalai
+    toliau eikvotų tą pačią paskyros ribą.
+    """
+
+    def __init__(self, concurrency):
+        self.sem = asyncio.Semaphore(max(1, concurrency))
+        self.resume_at = 0.0
+
+    def flood_wait(self, seconds):
+        self.resume_at = max(self.resume_at, time.time() + seconds)
+
+    async def wait(self):
+        delay = self.resume_at - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def _fetch_into(client, channel, min_id, messages):
+    if not INCREMENTAL_FETCH or not min_id:
+        messages[:] = reversed(await client.get_messages(channel, limit=FETCH_LIMIT))
+        return
+    async for msg in client.iter_messages(channel, min_id=min_id, reverse=True,
+                                          limit=MAX_FETCH_BACKLOG - len(messages)):
+        messages.append(msg)
+
+
+async def fetch_messages(channel, min_id, budget):
+    """Grąžina naujas kanalo žinutes (naujausia pirma).
+
+    Su checkpoint'u imamos tik žinutės, naujesnės nei min_id, nuo seniausios,
+    todėl net nutrūkus viduryje checkpoint'as gali pasislinkti be spragų.
+    """
+    client = get_client()
+    errors = timed_import("telethon.errors")
+    messages = []
+    async with budget.sem:
+        while len(messages) < MAX_FETCH_BACKLOG:
+            await budget.wait()
+            try:
+                with metrics.timer("telegram.fetch"):
+                    await _fetch_into(client, channel, min_id, messages)
+                break
+            except errors.FloodWaitError as e:
+                metrics.count("telegram.flood_waits")
+                if messages:
+                    min_id = messages[-1].id
+                if e.seconds > FLOOD_WAIT_MAX_SECONDS:
+                    logger.warning(f"⏳ {channel}: Telegram FloodWait {e.seconds} s - per ilgai, "
+                                   f"tęsiam su {len(messages)} žinutėmis")
+                    break
+                logger.warning(f"⏳ {channel}: Telegram FloodWait {e.seconds} s - "
+                               f"pauzė visiems kanalams")
+                budget.flood_wait(e.seconds)
+
+    if len(messages) >= MAX_FETCH_BACKLOG:
+        logger.info(f"📥 {channel}: pasiekta riba {MAX_FETCH_BACKLOG} žinučių - "
+                    f"likusios kitą kartą")
+    messages.reverse()
+    return messages
+
+
+# ====================================================================
+# MEDIJOS ATRANKA PAGAL METADUOMENIS
+# Telegram jau pateikia failo dydį, tikrą MIME tipą ir video atributus
+# (trukmė, matmenys), todėl sprendžiama PRIEŠ siunčiantis: per dideli ar
+# netinkami failai nesiunčiami visai, o iš albumo imamas vienas failas.
+# ====================================================================
+class Post(NamedTuple):
+    channel: str
+    id: int        # posto ID (albumo - pirmos žinutės ID)
+    msg: object    # žinutė, kurios medija parinkta
+    text: str
+    meta: dict     # parinktos medijos metaduomenys arba None
+
+
+def media_meta(msg):
+    """Medijos metaduomenys iš Telegram (be siuntimosi) arba None."""
+    f = msg.file if msg.media else None
+    if not f:
+        return None
+    return {
+        "size": f.size or 0,
+        "mime": f.mime_type or content_type_for(f.name or f.ext or ""),
+        "duration": getattr(f, "duration", None),
+        "width": getattr(f, "width", None),
+        "height": getattr(f, "height", None),
+    }
+
+
+def media_rank(msg, meta):
+    """Mažesnis - geresnis; None - medija mums netinka."""
+    if getattr(msg, "sticker", None):
+        return None
+    mime = meta["mime"]
+    if mime == "video/mp4":
+        return 0
+    if mime.startswith("video/"):
+        return 1
+    if mime.startswith("image/"):
+        return 2
+    return None
+
+
+def choose_media(msgs, skipped):
+    """Iš albumo (ar vienos žinutės) parenka vieną failą: pirma mp4, tada
+    kitas video, tada nuotrauka. Grąžina (žinutė, metaduomenys)."""
+    best = None
+    for msg in msgs:
+        meta = media_meta(msg)
+        if meta is None:
+            continue
+        rank = media_rank(msg, meta)
+        if rank is None:
+            logger.info(f"⏭️ Post {msg.id}: netinkamas tipas {meta['mime']} - nesiunčiam")
+        elif meta["size"] > MAX_MEDIA_SIZE:
+            logger.info(f"⏭️ Post {msg.id}: per didelis failas ({meta['size']} B) - nesiunčiam")
+        elif best is None or rank < best[0]:
+            if best:
+                skipped.append(best[2]["size"])
+            best = (rank, msg, meta)
+            continue
+        skipped.append(meta["size"])
+    if not best:
+        return None, None
+    _, msg, meta = best
+    if meta["duration"]:
+        logger.info(f"🎞️ Post {msg.id}: video {meta['width']}x{meta['height']}, "
+                    f"{meta['duration']:.0f} s, {meta['size'] / 1e6:.1f} MB")
+    return msg, meta
+
+
+def select_posts(channel, messages, skipped):
+    """Žinutės -> [Post]. Albumo žinutės sutraukiamos į vieną postą su
+    albumo tekstu ir viena, pagal metaduomenis parinkta medija."""
+    groups = {}
+    for msg in sorted(messages, key=lambda m: m.id):
+        grouped_id = getattr(msg, "grouped_id", None)
+        groups.setdefault(grouped_id or ("msg", msg.id), []).append(msg)
+
+    valid_posts = []
+    for msgs in groups.values():
+        first = msgs[0]
+        texts = [m.message or getattr(m, "caption", None) for m in msgs]
+        text = next((t for t in texts if t), None)
+        if not text:
+            logger.warning(f"⚠️ Praleidžiamas postas {first.id}, nes neturi teksto")
+            continue
+        if not any(m.media for m in msgs):
+            logger.warning(f"⚠️ Praleidžiamas postas {first.id}, nes neturi medijos failo")
+            continue
+        msg, meta = choose_media(msgs, skipped)
+        valid_posts.append(Post(channel, first.id, msg or first, text, meta))
+    return valid_posts
 
 
 # ====================================================================
 # PAGRINDINĖ FUNKCIJA
 # ====================================================================
 async def create_rss():
-    await client.connect()
-    last_post = load_last_post()
+    metrics.reset()
+    store = state_store.StateStore()
+    if daemon_lease_active(store):
+        # Nieko nerašom (net ataskaitos) - workflow neturės ką commit'inti
+        logger.info("🛑 Veikia demonas (nuoma galioja iki "
+                    f"{scheduler.format_ts(store.get_meta('daemon_lease_until'))}) - "
+                    "cron paleidimas praleidžiamas")
+        store.close()
+        return
+    try:
+        client = get_client()
+        # Prisijungimas ir yra pirmoji užklausa Telegram serveriui
+        startup_mark("first_telegram_request")
+        with metrics.timer("telegram.connect"):
+            await client.connect()
+        startup_mark("telegram_connected")
+        with metrics.timer("run.ingest"):
+            queue = await ingest(store)
+        with metrics.timer("run.publish"):
+            await publish_next(queue, store)
+    finally:
+        deliveries = store.delivery_stats(metrics.started())
+        store.close()
+        await close_http_clients()
+        report_startup()
+        metrics.write_report({"startup": STARTUP, "deliveries": deliveries})
+
+
+async def ingest(store):
+    """Naujos visų kanalų žinutės -> medija, RSS, eilė. Grąžina eilę."""
+    checkpoints = {c: store.get_checkpoint(checkpoint_channel(c)) for c in CHANNELS}
+    # Vienkartinis eilės atkūrimas po perkėlimo iš JSON: paskutinės FETCH_LIMIT
+    # žinučių (kaip senojoje versijoje), nepaskelbti video grįžta į eilę
+    bootstrap = store.get_meta("queue_bootstrap", False)
+    if bootstrap:
+        logger.info(f"📦 Eilė atkuriama iš paskutinių {FETCH_LIMIT} žinučių")
 
-    messages = await client.get_messages('Tsaplienko', limit=14)
+    # Visi kanalai skaitomi lygiagrečiai, bendro biudžeto ribose
+    budget = TelegramBudget(FETCH_CONCURRENCY)
+    fetched = await asyncio.gather(*(fetch_messages(c, 0 if bootstrap else checkpoints[c], budget)
+                                     for c in CHANNELS))
 
-    grouped_texts = {}
     valid_posts = []
+    skipped = []  # atrankos atmestų failų dydžiai
+    for channel, messages in zip(CHANNELS, fetched):
+        logger.info(f"📥 {channel}: gauta {len(messages)} naujų žinučių "
+                    f"(checkpoint {checkpoints[channel]})")
+        metrics.count("telegram.messages", len(messages))
+        valid_posts.extend(select_posts(channel, messages, skipped))
+    metrics.count("media.skipped_files", len(skipped))
+    metrics.count("media.skipped_bytes", sum(skipped))
+    if skipped:
+        logger.info(f"💾 Atranka pagal metaduomenis: nesiųsta {len(skipped)} failų "
+                    f"({sum(skipped) / 1e6:.1f} MB)")
 
-    for msg in messages:
-        text = msg.message or getattr(msg, "caption", None)
-        if not text:
-            logger.warning(f"⚠️ Praleidžiamas postas {msg.id}, nes neturi teksto")
+    queue = store.load_queue()
+    failed_ids = {}  # kanalas -> žinučių ID, kurių medija nepavyko
+
+    if valid_posts:
+        await update_feed(valid_posts, store, queue, failed_ids)
+        failed_ids = await settle_media_failures(store, valid_posts, failed_ids)
+    else:
+        logger.info("Naujų validių postų nerasta, RSS liks nepakitęs.")
+
+    # Checkpoint'as nepraeina pro postą, kurio medija nepavyko dėl klaidos -
+    # kitą kartą jis bus paimtas iš naujo (jau įkelta medija - iš indekso),
+    # bet ne daugiau kaip MEDIA_MAX_FAILURES kartų
+    new_checkpoints = {}
+    for channel, messages in zip(CHANNELS, fetched):
+        checkpoint = checkpoints[channel]
+        newest_id = max([checkpoint] + [msg.id for msg in messages])
+        if failed_ids.get(channel):
+            newest_id = max(checkpoint, min(failed_ids[channel]) - 1)
+        new_checkpoints[checkpoint_channel(channel)] = newest_id
+    store.save_ingest(new_checkpoints, queue)
+    if bootstrap:
+        # Nutrūkus prieš šią eilutę atkūrimas tiesiog pakartojamas (is_sent)
+        store.set_meta("queue_bootstrap", False)
+    return queue
+
+
+async def settle_media_failures(store, valid_posts, failed_ids):
+    """Skaičiuoja nepavykusias medijas state.db. Grąžina {kanalas: ID}, kurie
+    dar laiko checkpoint'ą; po MEDIA_MAX_FAILURES nesėkmių postas paleidžiamas."""
+    failed = {post_uid(channel, message_id): (channel, message_id)
+              for channel, ids in failed_ids.items() for message_id in ids}
+    store.clear_media_failures([uid for uid in (post_uid(p.channel, p.id) for p in valid_posts)
+                                if uid not in failed])
+    attempts = store.record_media_failures(failed, time.time())
+    blocking, given_up = {}, []
+    for uid, (channel, message_id) in failed.items():
+        if attempts[uid] < MEDIA_MAX_FAILURES:
+            blocking.setdefault(channel, set()).add(message_id)
             continue
-        if not msg.media:
-            logger.warning(f"⚠️ Praleidžiamas postas {msg.id}, nes neturi medijos failo")
+        given_up.append(uid)
+        metrics.count("media.given_up")
+        await notify(
+            f"🚫 MEDIJA NEPAVYKO {attempts[uid]} KARTUS IŠ EILĖS\n\n"
+            f"Postas: {feed_store.POST_LINK.format(uid)}\n"
+            "Checkpoint'as postą praleidžia - feed'e jis liks be medijos ir nebus skelbiamas."
+        )
+    store.clear_media_failures(given_up)
+    return blocking
+
+
+async def update_feed(valid_posts, store, queue, failed_ids):
+    queued_ids = {v["id"] for v in queue}
+
+    media_index = load_media_index()
+    media_results = await process_all_media(valid_posts, media_index, failed_ids)
+    save_media_index(media_index)
+
+    new_items = []
+    for post, media in zip(valid_posts, media_results):
+        channel, msg, text = post.channel, post.msg, post.text
+        post_id = post_uid(channel, post.id)
+        new_items.append(feed_store.make_item(post_id, msg.date, text, media, channel))
+        if not media:
             continue
-        if hasattr(msg.media, "grouped_id") and msg.media.grouped_id:
-            if msg.media.grouped_id not in grouped_texts:
-                grouped_texts[msg.media.grouped_id] = text
-            else:
-                text = grouped_texts[msg.media.grouped_id]
-        valid_posts.append((msg, text))
-
-    if not valid_posts:
-        logger.info("Naujų validių postų nerasta, RSS liks nepakitęs.")
+
+        if (media["content_type"].startswith("video/") and post_id not in queued_ids
+                and not store.is_sent(post_id)):
+            queued_ids.add(post_id)
+            queue.append({
+                "id": post_id,
+                "channel": channel,
+                "raw_text": text,
+                "video_url": media["url"],
+                "poster_url": media.get("poster_url"),
+                "link": feed_store.POST_LINK.format(post_id),
+                "pubdate": str(msg.date),
+                "ts": msg.date.timestamp(),
+                "priority": scheduler.priority_for(channel),
+            })
+
+    # Saugykla - RSS šaltinis: nauji įrašai prirašomi, rss.xml generuojamas
+    # iš naujausių MAX_POSTS įrašų (su jų medija)
+    feed_store.migrate_from_rss(RSS_FILE)
+    new_items.sort(key=lambda i: i["ts"])
+    with metrics.timer("feed.render"):
+        items = feed_store.load_items()
+        # Pakartotinai paimti (checkpoint'as laikomas) nepakitę įrašai neprirašomi
+        new_items = [i for i in new_items if items.get(i["id"]) != i]
+        feed_store.append_items(new_items)
+        items.update((i["id"], i) for i in new_items)
+        render_feeds(items)
+
+    logger.info("✅ RSS atnaujintas sėkmingai!")
+
+
+def render_feeds(items):
+    # Bendras feed'as - visi kanalai chronologine tvarka
+    feed_store.render_rss(feed_store.newest(items, MAX_POSTS), RSS_FILE)
+    if not CHANNEL_FEEDS:
         return
+    for channel in CHANNELS:
+        own = {k: i for k, i in items.items() if i.get("channel", LEGACY_CHANNEL) == channel}
+        feed_store.render_rss(feed_store.newest(own, MAX_POSTS),
+                              CHANNEL_RSS_FILE.format(channel),
+                              title=f"{feed_store.FEED_TITLE} ({channel})")
 
-    if len(valid_posts) < MAX_POSTS:
-        existing_items = load_existing_rss()
-        additional_needed = MAX_POSTS - len(valid_posts)
-        for item in existing_items[:additional_needed]:
-            fake_msg = type("FakeMsg", (object,), {})()
-            fake_msg.id = item.find("guid").text if item.find("guid") is not None else 0
-            fake_msg.date = item.find("pubDate").text if item.find("pubDate") is not None else ""
-            fake_text = item.find("description").text if item.find("description") is not None else ""
-            valid_posts.append((fake_msg, fake_text))
-            if len(valid_posts) >= MAX_POSTS:
-                break
 
-    valid_posts.sort(key=lambda x: get_datetime(x[0].date), reverse=True)
+# ====================================================================
+# IŠANKSTINIS VERTIMAS
+# ====================================================================
+async def pretranslate_one(video, sem):
+    async with sem:
+        lt_text, ok, report = await pipeline().translate_async(DEEPSEEK_API_KEY,
+                                                              video["raw_text"],
+                                                              post_id=video["id"])
+    await remember_translation(video, lt_text, ok, report)
 
-    fg = FeedGenerator()
-    fg.title('Latest news')
-    fg.link(href='https://www.mandarinai.lt/')
-    fg.description('Naujienų kanalą pristato www.mandarinai.lt')
 
-    seen_media = set()
-    sent_ids = load_sent_ids()
-    queue = []
+async def remember_translation(video, lt_text, ok, report):
+    if ok:
+        video["translation"] = {"text": lt_text, "ok": ok, "report": report,
+                                "ts": time.time()}
+        logger.info(f"🈂️ Video {video['id']} išverstas iš anksto")
+        if report and report != "ok":
+            video["translation_notified"] = True
+            await notify(
+                "🟡 Vertimas praėjo, bet su pastabomis\n\n"
+                f"Postas: {video['link']}\n"
+                f"Pastabos: {report}\n\n"
+                "Vertimas:\n"
+                f"{lt_text[:600]}"
+            )
+        return
 
-    for msg, text in valid_posts:
-        fe = fg.add_entry()
-        fe.title(text[:30] if text else "No Title")
-        fe.link(href=f"https://www.mandarinai.lt/post/{msg.id}")
-        fe.description(text if text else "No Content")
-        fe.pubDate(msg.date)
+    # Nepavykęs vertimas nesaugomas - prieš skelbiant bus bandoma dar kartą,
+    # bet apie bėdą pranešama vieną kartą, gerokai prieš skelbimo laiką
+    if not video.get("pretranslate_failed_notified"):
+        video["pretranslate_failed_notified"] = True
+        await notify(
+            "⚠️ IŠANKSTINIS VERTIMAS NEPAVYKO\n\n"
+            f"Postas: {video['link']}\n"
+            f"Priežastis: {report}\n\n"
+            "Video dar eilėje - prieš skelbiant bus bandoma dar kartą."
+        )
 
-        try:
-            media_path = await msg.download_media(file="./")
-            if not media_path:
-                logger.warning(f"⚠️ Nepavyko parsisiųsti medijos iš post {msg.id}")
-                continue
-
-            if isinstance(media_path, list):
-                mp4_files = [p for p in media_path if p.lower().endswith('.mp4')]
-                media_path = mp4_files[0] if mp4_files else media_path[0]
-
-            if os.path.getsize(media_path) > MAX_MEDIA_SIZE:
-                logger.info(f"❌ Didelis failas - {media_path}, praleidžiamas")
-                os.remove(media_path)
-                continue
-
-            video_extensions = ['.mp4', '.mov', '.mkv', '.avi', '.wmv', '.flv', '.webm']
-            if media_path.lower().endswith(tuple(video_extensions)):
-                content_type = 'video/mp4'
-            else:
-                content_type = 'image/jpeg'
-
-            blob_name = os.path.basename(media_path)
-            blob = bucket.blob(blob_name)
-
-            if not blob.exists():
-                blob.upload_from_filename(media_path)
-                blob.content_type = content_type
-                logger.info(f"✅ Įkėlėme {blob_name} į Google Cloud Storage")
-            else:
-                logger.info(f"🔄 {blob_name} jau egzistuoja Google Cloud Storage")
-
-            media_url = f"https://storage.googleapis.com/{bucket_name}/{blob_name}"
-
-            if blob_name not in seen_media:
-                seen_media.add(blob_name)
-                fe.enclosure(url=media_url, type=content_type,
-                             length=str(os.path.getsize(media_path)))
-
-            post_id = str(msg.id)
-            if content_type == 'video/mp4' and post_id not in sent_ids:
-                queue.append({
-                    "id": post_id,
-                    "raw_text": text,
-                    "video_url": media_url,
-                    "link": f"https://www.mandarinai.lt/post/{msg.id}",
-                    "pubdate": str(msg.date),
-                    "_sort": get_datetime(msg.date),
-                })
-
-            os.remove(media_path)
-        except Exception as e:
-            logger.error(f"❌ Klaida apdorojant mediją iš post {msg.id}: {e}")
 
-    save_last_post({"id": valid_posts[0][0].id})
+async def pretranslate(queue, store):
+    # Paketiniame režime analizė ir peržiūra bendros keliems postams, todėl
+    # per vieną kartą verčiama daugiau eilės (PRETRANSLATE_BATCH_AHEAD).
+    # Pipeline (httpx, taisyklių variklis) importuojamas tik jei yra ką versti.
+    widest = max(PRETRANSLATE_AHEAD, PRETRANSLATE_BATCH_AHEAD)
+    if not DEEPSEEK_API_KEY or all(v.get("translation") for v in queue[:widest]):
+        return
+    batch_mode = pipeline().BATCH_MODE
+    ahead = PRETRANSLATE_BATCH_AHEAD if batch_mode else PRETRANSLATE_AHEAD
+    pending = [v for v in queue[:ahead] if not v.get("translation")]
+    if not pending:
+        return
+    logger.info(f"🈂️ Verčiam iš anksto {len(pending)} video")
+    if batch_mode and len(pending) > 1:
+        results = await pipeline().translate_batch_async(
+            DEEPSEEK_API_KEY, [(v["id"], v["raw_text"]) for v in pending])
+        for video in pending:
+            await remember_translation(video, *results[video["id"]])
+    else:
+        sem = asyncio.Semaphore(PRETRANSLATE_CONCURRENCY)
+        await asyncio.gather(*(pretranslate_one(v, sem) for v in pending))
+    store.save_queue(queue)
 
-    with open(RSS_FILE, "wb") as f:
-        f.write(fg.rss_str(pretty=True))
 
-    logger.info("✅ RSS atnaujintas sėkmingai!")
+# ====================================================================
+# POSTINIMAS: 1 video, kai ateina planuoklio slotas (scheduler.py).
+# Tvarka: prioritetas, tada kanalai ratu, kanalo viduje seniausias pirmas.
+# ====================================================================
+async def publish_next(queue, store):
+    # Nepristatytas outbox siuntimas tęsiamas pirmiausia - tas pats postas
+    # su tuo pačiu vertimu, be naujo sprendimo, ką skelbti
+    pending = store.next_outbox()
+    if pending:
+        await deliver_outbox(pending, queue, store)
+        return
+
+    now = time.time()
+    expired = scheduler.drop_expired(queue, now)
+    for video in expired:
+        logger.info(f"🗑️ Video {video['id']} per senas "
+                    f"({int((now - video['ts']) / 3600)} val.) - išimtas iš eilės")
+    if expired:
+        store.save_queue(queue)
 
-    # ================================================================
-    # POSTINIMAS: 1 video per paleidimą, ne dažniau kaip 1 kartą per valandą,
-    # seniausias pirmas (FB tvarka lieka chronologinė).
-    # ================================================================
     if not queue:
         logger.info("🎬 Naujų video nėra - nieko nesiunčiam.")
         return
 
-    queue.sort(key=lambda v: v["_sort"])
+    queue[:] = scheduler.order(queue, store, LEGACY_CHANNEL)
     logger.info(f"🎬 Eilėje laukia {len(queue)} video.")
 
-    now = time.time()
-    elapsed = now - load_last_sent_ts()
-
-    if elapsed < MIN_INTERVAL_SECONDS:
-        wait_min = int((MIN_INTERVAL_SECONDS - elapsed) / 60)
-        logger.info(f"⏳ Nuo paskutinio posto praėjo tik {int(elapsed/60)} min. "
-                    f"Laukiam dar {wait_min} min. (riba: 1 postas/val.)")
+    slot = scheduler.next_slot(store, now)
+    if slot > now:
+        logger.info(f"⏳ Kitas skelbimo slotas {scheduler.format_ts(slot)} "
+                    f"(po {int((slot - now) / 60)} min.)")
+        await pretranslate(queue, store)
         return
 
     video = queue[0]
     logger.info(f"🚀 Skelbiam video {video['id']} ({video['pubdate']})")
 
-    lt_text, ok, report = translate_pipeline.translate(DEEPSEEK_API_KEY, video["raw_text"])
+    ready = video.get("translation")
+    if ready:
+        logger.info("🈂️ Naudojam iš anksto paruoštą vertimą")
+        lt_text, ok, report = ready["text"], ready["ok"], ready["report"]
+    else:
+        lt_text, ok, report = await pipeline().translate_async(DEEPSEEK_API_KEY,
+                                                              video["raw_text"],
+                                                              post_id=video["id"])
 
     if not ok:
         await notify(
@@ -319,7 +1038,7 @@ async def create_rss():
             "Originalas:\n"
             f"{video['raw_text'][:500]}"
         )
-    elif report and report != "ok":
+    elif report and report != "ok" and not video.get("translation_notified"):
         await notify(
             "🟡 Vertimas praėjo, bet su pastabomis\n\n"
             f"Postas: {video['link']}\n"
@@ -332,28 +1051,277 @@ async def create_rss():
         "id": video["id"],
         "description": lt_text,
         "video_url": video["video_url"],
+        "poster_url": video.get("poster_url"),
         "link": video["link"],
         "pubdate": video["pubdate"],
         "translation_ok": ok,
     }
 
-    if send_to_make(payload):
-        sent_ids.append(video["id"])
-        save_sent_ids(sent_ids)
-        save_last_sent_ts(now)
-        logger.info(f"✅ Paskelbta. Eilėje liko {len(queue) - 1} video "
-                    f"(kitas ne anksčiau kaip po 1 val.)")
-    else:
+    entry = make_outbox().enqueue(store, video["id"],
+                                  video.get("channel", LEGACY_CHANNEL), payload)
+    await deliver_outbox(entry, queue, store)
+
+
+async def deliver_outbox(entry, queue, store):
+    outbox = make_outbox()
+    wait = entry["next_at"] - time.time()
+    if wait > 0:
+        logger.info(f"📮 Make siuntimas post {entry['post_id']} kartojamas po "
+                    f"{int(wait / 60)} min. (bandymų: {entry['attempts']})")
+        return
+
+    status = await outbox.deliver(store, entry)
+    if status in ("delivered", "dead"):
+        # DB eilė sutvarkyta transakcijoje - čia tik atmintyje esanti kopija
+        queue[:] = [v for v in queue if v["id"] != entry["post_id"]]
+    if status == "delivered":
+        logger.info(f"✅ Paskelbta. Eilėje liko {len(queue)} video "
+                    f"(kitas slotas {scheduler.format_ts(scheduler.next_slot(store, time.time()))})")
+        await pretranslate(queue, store)
+    elif status == "dead":
+        last_error = store.get_outbox(entry["key"])["last_error"]
         await notify(
-            "🔴 Make webhook NEPASIEKIAMAS\n\n"
-            f"Postas: {video['link']}\n"
-            "Video NEPASKELBTAS. Bus bandoma dar kartą kito paleidimo metu."
+            "☠️ Make webhook: siuntimas ATMESTAS GALUTINAI\n\n"
+            f"Postas: {entry['payload']['link']}\n"
+            f"Po {outbox.MAX_ATTEMPTS} bandymų. Paskutinė klaida: {last_error}\n"
+            "Video išimtas iš eilės ir NEPASKELBTAS."
         )
+    else:
+        # Pranešama tik po pirmos nesėkmės (įskaitant atidėjimą be URL),
+        # ne kaskart kartojant
+        if entry["last_error"] is None:
+            await notify(
+                "🔴 Make webhook NEPASIEKIAMAS\n\n"
+                f"Postas: {entry['payload']['link']}\n"
+                "Video NEPASKELBTAS. Siuntimas liko outbox'e ir bus kartojamas."
+            )
+
+
+# ====================================================================
+# DEMONO REŽIMAS (python main.py --daemon)
+# Viena nuolatinė Telegram jungtis: nauji kanalo postai (NewMessage /
+# Album įvykiai) apdorojami iškart, o skelbimo laikas skaičiuojamas
+# vidiniu planuokliu. GCS ir DeepSeek klientai lieka "šilti" visą laiką.
+# Vienkartinis create_rss() režimas cron'ui veikia kaip anksčiau.
+#
+# Demonas pats publikuoja docs/ į git (DAEMON_GIT_PUSH) ir state.db laiko
+# "nuomą": kol ji galioja, cron paleidimas iškart baigiasi. Cron workflow
+# galima ir visai išjungti - repozitorijos kintamasis FEED_DAEMON=1.
+# ====================================================================
+def daemon_lease_active(store, now=None):
+    return store.get_meta("daemon_lease_until", 0) > (now or time.time())
+
+
+async def _git(*args):
+    proc = await asyncio.create_subprocess_exec(
+        "git", *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+    out, _ = await proc.communicate()
+    return proc.returncode, out.decode("utf-8", "replace").strip()
+
+
+async def _push_docs():
+    """Rebase ant naujausio nutolusios šakos varianto ir push. Atmestas push
+    (kas nors spėjo commit'inti) kartojamas su nauju rebase."""
+    rc, out = 1, ""
+    for attempt in range(1, DAEMON_PUSH_ATTEMPTS + 1):
+        # Demonas commit'ina tik docs/, o būsenos savininkas (nuoma) - jis:
+        # konfliktas (pvz. state.db) sprendžiamas demono naudai (-X theirs)
+        rc, out = await _git("pull", "-q", "--rebase", "--autostash", "-X", "theirs",
+                             DAEMON_GIT_REMOTE, DAEMON_GIT_BRANCH)
+        if rc != 0:
+            await _git("rebase", "--abort")
+            return rc, out
+        rc, out = await _git("push", "-q", DAEMON_GIT_REMOTE, f"HEAD:{DAEMON_GIT_BRANCH}")
+        if rc == 0:
+            return rc, out
+        logger.warning(f"⚠️ Demonas: push atmestas (bandymas {attempt}): {out[-200:]}")
+        await asyncio.sleep(attempt * 2)
+    return rc, out
+
+
+def renew_daemon_lease(store):
+    now = time.time()
+    if store.get_meta("daemon_lease_until", 0) - now < DAEMON_LEASE_SECONDS / 2:
+        store.set_meta("daemon_lease_until", now + DAEMON_LEASE_SECONDS)
+
+
+async def publish_docs(store, renew=True):
+    """docs/ -> git commit + push, jei pasikeitė feed'as ar būsena arba
+    liko nepush'intų commit'ų. Nuoma pratęsiama visada (ji keliauja su
+    state.db), net jei git publikavimas išjungtas."""
+    if renew:
+        renew_daemon_lease(store)
+    if not DAEMON_GIT_PUSH:
+        return
+    store.flush()
+    try:
+        await _git("add", "-A", "docs/")
+        excluded = [f":!{path}" for path in DOCS_REPORT_FILES]
+        rc, _ = await _git("diff", "--cached", "--quiet", "--", "docs/", *excluded)
+        changed = rc != 0
+        rc, unpushed = await _git("rev-list", "--count",
+                                  f"{DAEMON_GIT_REMOTE}/{DAEMON_GIT_BRANCH}..HEAD")
+        if not changed and rc == 0 and unpushed == "0":
+            return
+        with metrics.timer("daemon.git_push"):
+            rc, out = 0, ""
+            if changed:
+                rc, out = await _git("commit", "-q", "-m", "🔄 Auto-update RSS feed")
+            if rc == 0:
+                rc, out = await _push_docs()
+        if rc != 0:
+            logger.warning(f"⚠️ Demonas: docs/ publikuoti nepavyko: {out[-300:]}")
+        else:
+            logger.info("📤 Demonas: docs/ publikuotas")
+    except OSError as e:
+        logger.warning(f"⚠️ Demonas: git nepasiekiamas ({e}) - docs/ nepublikuotas")
+
+
+async def ingest_worker(store, lock, new_posts, publish_wake):
+    while True:
+        # Jei įvykis praslydo (pvz. nutrūko ryšys) - atsarginis patikrinimas
+        try:
+            await asyncio.wait_for(new_posts.wait(), timeout=DAEMON_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        # Albumo dalys ateina keliais įvykiais - palaukiam, kol ateis visos
+        await asyncio.sleep(DAEMON_DEBOUNCE_SECONDS)
+        new_posts.clear()
+        try:
+            async with lock:
+                with metrics.timer("run.ingest"):
+                    await ingest(store)
+                await publish_docs(store)
+            publish_wake.set()
+            # Demono ataskaita - viskas nuo ankstesnio ciklo (ir skelbimai)
+            metrics.write_report({"deliveries": store.delivery_stats(metrics.started())})
+            metrics.reset()
+        except Exception as e:
+            logger.error(f"❌ Demonas: klaida apdorojant naujus postus: {e}")
+
+
+async def publish_worker(store, lock, publish_wake):
+    while True:
+        try:
+            async with lock:
+                with metrics.timer("run.publish"):
+                    await publish_next(store.load_queue(), store)
+                await publish_docs(store)
+        except Exception as e:
+            logger.error(f"❌ Demonas: klaida skelbiant: {e}")
+
+        # Miegam iki tikslaus kito sloto / outbox pakartojimo (arba kol
+        # atsiras naujas video); tuščia eilė - laukiam tik naujo video
+        pending = store.next_outbox()
+        if pending:
+            next_at = pending["next_at"]
+        elif store.load_queue():
+            next_at = scheduler.next_slot(store, time.time())
+        else:
+            next_at = time.time() + DAEMON_POLL_SECONDS
+        delay = min(max(next_at - time.time(), 1.0), DAEMON_POLL_SECONDS)
+        publish_wake.clear()
+        try:
+            await asyncio.wait_for(publish_wake.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_daemon():
+    global DAEMON_GIT_PUSH
+    client = get_client()
+    events = timed_import("telethon.events")
+    if DAEMON_GIT_PUSH and (await _git("rev-parse", "--git-dir"))[0] != 0:
+        logger.warning("⚠️ Demonas: ne git repozitorija - docs/ nebus publikuojamas")
+        DAEMON_GIT_PUSH = False
+    if not DAEMON_GIT_PUSH and not DAEMON_STANDALONE:
+        # Nuoma lieka tik vietiniame state.db - cron jos nematytų ir siųstų
+        # tą pačią eilę į Make kartu su demonu
+        logger.error("❌ Demonas nestartuoja: be git publikavimo cron nemato nuomos. "
+                     "Išjunkite cron (FEED_DAEMON=1) ir nustatykite DAEMON_STANDALONE=1")
+        return
+    if DAEMON_GIT_PUSH:
+        # Naujausia būsena (ir cron commit'ai) - prieš atidarant state.db
+        rc, out = await _git("pull", "-q", "--ff-only", DAEMON_GIT_REMOTE, DAEMON_GIT_BRANCH)
+        if rc != 0:
+            logger.warning(f"⚠️ Demonas: git pull nepavyko: {out[-300:]}")
+    startup_mark("first_telegram_request")
+    await client.connect()
+    startup_mark("telegram_connected")
+    store = state_store.StateStore()
+    # Nuoma iškart: nuo šiol cron paleidimai nieko nedaro
+    await publish_docs(store)
+    lock = asyncio.Lock()
+    new_posts = asyncio.Event()
+    publish_wake = asyncio.Event()
+
+    async def on_new_post(event):
+        new_posts.set()
+
+    client.add_event_handler(on_new_post, events.NewMessage(chats=CHANNELS))
+    client.add_event_handler(on_new_post, events.Album(chats=CHANNELS))
+    # Telethon siunčia atnaujinimus tik po pirmos užklausos kanalui
+    for channel in CHANNELS:
+        await client.get_input_entity(channel)
+    new_posts.set()  # pirmas apdorojimas iškart paleidus
+
+    logger.info(f"👂 Demonas klausosi kanalų: {', '.join(CHANNELS)}")
+    workers = [
+        asyncio.create_task(ingest_worker(store, lock, new_posts, publish_wake)),
+        asyncio.create_task(publish_worker(store, lock, publish_wake)),
+    ]
+    try:
+        await client.run_until_disconnected()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        # Tvarkingai sustojus cron perima iškart, nelaukdamas nuomos pabaigos
+        store.set_meta("daemon_lease_until", 0)
+        await publish_docs(store, renew=False)
+        store.close()
+        await close_http_clients()
+
+
+STARTUP["module_ms"] = _ms_since_start()
+
+
+# ====================================================================
+# SKELBIMO PLANAS (python main.py --plan) - tik skaito state.db
+# ====================================================================
+def print_plan():
+    try:
+        store = state_store.StateStore(readonly=True)
+    except FileNotFoundError:
+        print(f"{state_store.STATE_DB} dar nėra - nėra ką skelbti.")
+        return
+    try:
+        now = time.time()
+        pending = store.next_outbox()
+        if pending:
+            print(f"{scheduler.format_ts(max(now, pending['next_at']))}  "
+                  f"outbox  post {pending['post_id']} (bandymų: {pending['attempts']})")
+        rows = scheduler.plan(store.load_queue(), store, now, LEGACY_CHANNEL)
+        if not rows and not pending:
+            print("Eilė tuščia - nėra ką skelbti.")
+        for slot, video, action in rows:
+            label = "skelbti" if action == "publish" else "pasens "
+            print(f"{scheduler.format_ts(slot)}  {label}  post {video['id']} "
+                  f"[{video.get('channel', LEGACY_CHANNEL)}, prioritetas "
+                  f"{video.get('priority', 0)}]")
+    finally:
+        store.close()
 
 
 # ====================================================================
 # PALEIDIMAS
 # ====================================================================
 if __name__ == "__main__":
+    if "--plan" in sys.argv[1:]:
+        print_plan()
+        sys.exit(0)
     loop = asyncio.get_event_loop()
-    loop.run_until_complete(create_rss())
+    if "--daemon" in sys.argv[1:]:
+        loop.run_until_complete(run_daemon())
+    else:
+        loop.run_until_complete(create_rss())
@@ -0,0 +1,167 @@
+# ====================================================================
+# VIDEO PARUOŠIMAS PRIEŠ ĮKĖLIMĄ (faststart + poster)
+#
+#   - faststart: jei MP4 'moov' atomas yra po 'mdat' (failo gale), ffmpeg
+#     be perkodavimo (-c copy -movflags +faststart) perkelia jį į pradžią.
+#     Tada grotuvas (Facebook per Make, RSS skaitytuvai) pradeda rodyti
+#     neparsisiuntęs viso failo;
+#   - poster: mažas JPEG kadras (ffmpeg), o jei ffmpeg nėra ar nepavyko -
+#     Telegram miniatiūra. Įkeliamas šalia video ir rodomas feed'e
+#     (media:thumbnail).
+#
+# Abu žingsniai neprivalomi (MEDIA_FASTSTART, MEDIA_POSTER) ir riboti laiku
+# (MEDIA_POSTPROCESS_TIMEOUT); nepavykus keliamas originalus failas.
+# Sutaupymas matuojamas baitais iki pirmo kadro: su 'moov' gale grotuvui
+# reikia viso failo, su faststart - tik pradžios iki 'moov' pabaigos.
+# ====================================================================
+
+import os
+import time
+import shutil
+import struct
+import asyncio
+import logging
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+FASTSTART_ENABLED = os.getenv("MEDIA_FASTSTART", "1") == "1"
+POSTER_ENABLED = os.getenv("MEDIA_POSTER", "1") == "1"
+POSTPROCESS_TIMEOUT = float(os.getenv("MEDIA_POSTPROCESS_TIMEOUT", "60"))
+FFMPEG = os.getenv("FFMPEG_BINARY", "ffmpeg")
+
+POSTER_WIDTH = 480
+POSTER_SEEK_SECONDS = 1.0
+# "Pirmo kadro" laikui įvertinti: ~16 Mbit/s mobilusis ryšys
+REFERENCE_BANDWIDTH = int(os.getenv("MEDIA_REFERENCE_BANDWIDTH", str(2_000_000)))
+
+FASTSTART_TYPES = ("video/mp4", "video/quicktime")
+
+_ffmpeg_path = None
+
+
+def ffmpeg_available():
+    global _ffmpeg_path
+    if _ffmpeg_path is None:
+        _ffmpeg_path = shutil.which(FFMPEG) or ""
+        if not _ffmpeg_path:
+            logger.info(f"ℹ️ {FFMPEG} nerastas - faststart išjungtas, poster iš Telegram")
+    return bool(_ffmpeg_path)
+
+
+def wants_local_file(content_type):
+    """Ar video reikia parsisiųsti į diską (faststart veikia tik su failu)."""
+    return FASTSTART_ENABLED and content_type in FASTSTART_TYPES and ffmpeg_available()
+
+
+# ---------------- MP4 atomai ----------------
+def top_level_atoms(path):
+    """[(tipas, poslinkis, dydis)] - tik viršutinio lygio MP4 atomai."""
+    atoms = []
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        offset = 0
+        while offset + 8 <= file_size:
+            f.seek(offset)
+            size, kind = struct.unpack(">I4s", f.read(8))
+            if size == 1:
+                size = struct.unpack(">Q", f.read(8))[0]
+            elif size == 0:
+                size = file_size - offset
+            if size < 8:
+                break  # ne MP4 arba sugadintas
+            atoms.append((kind.decode("latin-1"), offset, size))
+            offset += size
+    return atoms
+
+
+def first_frame_bytes(path):
+    """Kiek baitų grotuvas turi gauti, kol gali pradėti rodyti (None - ne MP4)."""
+    atoms = {kind: (offset, size) for kind, offset, size in reversed(top_level_atoms(path))}
+    if "moov" not in atoms or "mdat" not in atoms:
+        return None
+    moov_offset, moov_size = atoms["moov"]
+    if moov_offset < atoms["mdat"][0]:
+        return moov_offset + moov_size
+    return os.path.getsize(path)
+
+
+def needs_faststart(path):
+    atoms = [kind for kind, _, _ in top_level_atoms(path)]
+    return "moov" in atoms and "mdat" in atoms and atoms.index("moov") > atoms.index("mdat")
+
+
+# ---------------- ffmpeg ----------------
+async def _ffmpeg(*args):
+    proc = await asyncio.create_subprocess_exec(
+        _ffmpeg_path or FFMPEG, "-hide_banner", "-loglevel", "error", "-y", *args,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE)
+    try:
+        _, stderr = await asyncio.wait_for(proc.communicate(), POSTPROCESS_TIMEOUT)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise RuntimeError(f"ffmpeg neužbaigė per {POSTPROCESS_TIMEOUT:.0f} s")
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg klaida {proc.returncode}: "
+                           f"{stderr.decode('utf-8', 'replace')[-300:]}")
+
+
+async def faststart(src, workdir):
+    """Grąžina kelią į faststart failą arba src (jei nereikia / nepavyko)."""
+    if not (FASTSTART_ENABLED and ffmpeg_available()):
+        return src
+    before = first_frame_bytes(src)
+    if before is None or not needs_faststart(src):
+        metrics.count("media.faststart_skipped")
+        return src
+
+    dst = os.path.join(workdir, "faststart" + os.path.splitext(src)[1])
+    started = time.perf_counter()
+    try:
+        with metrics.timer("media.faststart"):
+            # bitexact: tas pats šaltinis -> tie patys baitai (turinio hash vardui)
+            await _ffmpeg("-i", src, "-map", "0", "-c", "copy", "-movflags", "+faststart",
+                          "-fflags", "+bitexact", dst)
+        after = first_frame_bytes(dst)
+        if after is None:
+            raise RuntimeError("rezultatas - ne MP4")
+    except Exception as e:
+        metrics.count("media.faststart_failed")
+        logger.warning(f"⚠️ Faststart nepavyko ({e}) - keliam originalą")
+        return src
+
+    saved = max(0, before - after)
+    metrics.count("media.faststart_remuxed")
+    metrics.count("media.first_frame_bytes_saved", saved)
+    metrics.count("media.first_frame_ms_saved_est", round(saved / REFERENCE_BANDWIDTH * 1000))
+    logger.info(f"⏩ Faststart per {time.perf_counter() - started:.1f} s: iki pirmo kadro "
+                f"{before / 1e6:.1f} MB -> {after / 1e3:.0f} KB")
+    return dst
+
+
+async def poster(video_path, workdir, msg):
+    """Poster JPEG kelias arba None. video_path=None - tik Telegram miniatiūra."""
+    if not POSTER_ENABLED:
+        return None
+    dst = os.path.join(workdir, "poster.jpg")
+    if video_path and ffmpeg_available():
+        try:
+            await _ffmpeg("-ss", str(POSTER_SEEK_SECONDS), "-i", video_path,
+                          "-frames:v", "1", "-vf", f"scale={POSTER_WIDTH}:-2", "-q:v", "5", dst)
+            # Trumpesniame nei POSTER_SEEK_SECONDS video kadro nebus
+            if os.path.exists(dst) and os.path.getsize(dst) > 0:
+                metrics.count("media.posters_ffmpeg")
+                return dst
+        except Exception as e:
+            logger.warning(f"⚠️ Poster kadras nepavyko ({e}) - imam Telegram miniatiūrą")
+    try:
+        path = await asyncio.wait_for(msg.download_media(file=dst, thumb=-1), POSTPROCESS_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"⚠️ Telegram miniatiūros gauti nepavyko: {e}")
+        return None
+    if path and os.path.exists(path) and os.path.getsize(path) > 0:
+        metrics.count("media.posters_thumb")
+        return path
+    return None
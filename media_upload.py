@@ -0,0 +1,126 @@
+# ====================================================================
+# MEDIJOS ĮKĖLIMAS Į GCS
+#
+#   - objekto vardas - turinio sha256 (media/<hash>.mp4): tas pats vardas
+#     visada reiškia tą patį turinį, todėl objektą saugu kešuoti "amžinai",
+#     o skirtingų kanalų failai nebesusiduria vienodais Telethon vardais
+#     (document_<data>.mp4);
+#   - Content-Type ir Cache-Control (immutable) nustatomi kuriant objektą -
+#     ne po įkėlimo, kai jų jau niekas nebeišsiunčia į GCS;
+#   - dideli failai (>= PARALLEL_UPLOAD_THRESHOLD) keliami lygiagrečiomis
+#     dalimis (transfer_manager, XML multipart), o srautiniame režime -
+#     resumable sesijos gabalais;
+#   - STORAGE_EMULATOR_HOST - vietinis GCS emuliatorius (pvz. fake-gcs-server),
+#     jungiamasi be kredencialų.
+#
+# Srautu keliamo failo turinio hash žinomas tik pabaigoje, todėl jis keliamas
+# laikinu vardu (incoming/...) ir serverio pusėje nukopijuojamas į galutinį.
+# Visos funkcijos blokuojančios - kviečiamos per asyncio.to_thread.
+# ====================================================================
+
+import os
+import uuid
+import logging
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+MEDIA_PREFIX = "media/"
+STAGING_PREFIX = "incoming/"
+CACHE_CONTROL = os.getenv("MEDIA_CACHE_CONTROL", "public, max-age=31536000, immutable")
+
+# 0 - lygiagretus įkėlimas išjungtas
+PARALLEL_UPLOAD_THRESHOLD = int(os.getenv("PARALLEL_UPLOAD_THRESHOLD", str(16 * 1024 * 1024)))
+PARALLEL_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+PARALLEL_UPLOAD_WORKERS = int(os.getenv("PARALLEL_UPLOAD_WORKERS", "4"))
+
+EMULATOR_HOST = os.getenv("STORAGE_EMULATOR_HOST")
+PUBLIC_URL_BASE = os.getenv("MEDIA_PUBLIC_URL_BASE",
+                            EMULATOR_HOST or "https://storage.googleapis.com").rstrip("/")
+
+
+def blob_name_for(digest, ext):
+    return f"{MEDIA_PREFIX}{digest[:32]}{(ext or '').lower()}"
+
+
+def staging_name():
+    return f"{STAGING_PREFIX}{uuid.uuid4().hex}"
+
+
+def public_url(bucket_name, blob_name):
+    return f"{PUBLIC_URL_BASE}/{bucket_name}/{blob_name}"
+
+
+def new_blob(bucket, name, content_type, **kwargs):
+    """Blob su metaduomenimis, kurie išsiunčiami kartu su įkėlimu."""
+    blob = bucket.blob(name, **kwargs)
+    blob.content_type = content_type
+    blob.cache_control = CACHE_CONTROL
+    return blob
+
+
+def _upload_parallel(blob, path):
+    try:
+        from google.cloud.storage import transfer_manager
+    except ImportError:
+        return False
+    try:
+        # Gijos, ne procesai: darbas - tinklas, o blob'o nereikia serializuoti
+        transfer_manager.upload_chunks_concurrently(
+            path, blob, content_type=blob.content_type,
+            chunk_size=PARALLEL_UPLOAD_CHUNK_SIZE, max_workers=PARALLEL_UPLOAD_WORKERS,
+            worker_type=transfer_manager.THREAD)
+        return True
+    except Exception as e:
+        logger.warning(f"⚠️ Lygiagretus {blob.name} įkėlimas nepavyko ({e}) - "
+                       f"keliam vienu srautu")
+        return False
+
+
+def upload_file(bucket, path, blob_name, content_type):
+    """Įkelia failą. True - įkelta, False - objektas jau buvo."""
+    blob = new_blob(bucket, blob_name, content_type)
+    if blob.exists():
+        return False
+    if PARALLEL_UPLOAD_THRESHOLD and os.path.getsize(path) >= PARALLEL_UPLOAD_THRESHOLD:
+        if _upload_parallel(blob, path):
+            metrics.count("media.parallel_uploads")
+            return True
+    blob.upload_from_filename(path, content_type=content_type)
+    return True
+
+
+def open_staged(bucket, content_type, chunk_size):
+    """Resumable sesija laikinu vardu. Grąžina (blob, writer)."""
+    blob = new_blob(bucket, staging_name(), content_type, chunk_size=chunk_size)
+    return blob, blob.open("wb", content_type=content_type)
+
+
+def finalize_staged(bucket, staged, blob_name):
+    """Laikinas objektas -> turinio vardas (metaduomenys kopijuojami kartu).
+    True - sukurtas naujas objektas, False - toks turinys jau buvo."""
+    try:
+        if bucket.get_blob(blob_name) is not None:
+            return False
+        bucket.copy_blob(staged, bucket, blob_name)
+        return True
+    finally:
+        try:
+            staged.delete()
+        except Exception as e:
+            logger.warning(f"⚠️ Nepavyko ištrinti laikino objekto {staged.name}: {e}")
+
+
+def commit_staged(bucket, staged, writer, blob_name):
+    """Užbaigia srautinę sesiją (paskutinis gabalas) ir perkelia objektą į
+    turinio vardą. Nepavykus užbaigti - sesija atšaukiama."""
+    try:
+        writer.close()
+    except BaseException:
+        try:
+            writer.terminate()
+        except Exception as e:
+            logger.warning(f"⚠️ Nepavyko atšaukti GCS sesijos {staged.name}: {e}")
+        raise
+    return finalize_staged(bucket, staged, blob_name)
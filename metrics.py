@@ -0,0 +1,166 @@
+# ====================================================================
+# PALEIDIMO METRIKOS
+#
+# Laikmačiai ir skaitikliai karštame kelyje (Telegram, medija, GCS,
+# DeepSeek pakopos, Make), surenkami vieno paleidimo metu ir įrašomi:
+#   docs/run_report.json   – šio paleidimo ataskaita (+ p50/p95 per pakopą)
+#   docs/run_history.json  – paskutinių RUN_HISTORY_LIMIT paleidimų pakopų laikai
+#   docs/metrics.prom      – Prometheus textfile (jei METRICS_PROMETHEUS=1)
+#
+# Modulis be išorinių priklausomybių - jį galima importuoti iš bet kur.
+# ====================================================================
+
+import os
+import json
+import time
+import logging
+import contextlib
+
+logger = logging.getLogger(__name__)
+
+RUN_REPORT_FILE = "docs/run_report.json"
+RUN_HISTORY_FILE = "docs/run_history.json"
+RUN_HISTORY_LIMIT = 200
+PROMETHEUS_FILE = "docs/metrics.prom"
+PROMETHEUS_ENABLED = os.getenv("METRICS_PROMETHEUS", "0") == "1"
+PROMETHEUS_PREFIX = "telegram_rss"
+
+_timers = {}
+_counters = {}
+_started = time.time()
+
+
+def reset():
+    """Naujas paleidimas (demono režime - kiekvienas ciklas)."""
+    global _started
+    _timers.clear()
+    _counters.clear()
+    _started = time.time()
+
+
+def started():
+    """Dabartinio paleidimo (ciklo) pradžia."""
+    return _started
+
+
+def observe(name, seconds):
+    t = _timers.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+    t["count"] += 1
+    t["total_s"] += seconds
+    t["max_s"] = max(t["max_s"], seconds)
+
+
+@contextlib.contextmanager
+def timer(name):
+    """with metrics.timer("pakopa"): ... - veikia ir async funkcijose."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+
+def count(name, value=1):
+    if value:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def snapshot():
+    return {
+        "stages": {name: {"count": t["count"], "total_s": round(t["total_s"], 4),
+                          "max_s": round(t["max_s"], 4)}
+                   for name, t in sorted(_timers.items())},
+        "counters": dict(sorted(_counters.items())),
+    }
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    i = min(len(values) - 1, max(0, round(q * (len(values) - 1))))
+    return values[i]
+
+
+def _load_history(path):
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"❌ {path} sugadintas, istorija pradedama iš naujo: {e}")
+        return []
+
+
+def _write_json(path, data, **kwargs):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, **kwargs)
+    os.replace(tmp, path)
+
+
+def _prometheus(report):
+    p = PROMETHEUS_PREFIX
+    lines = [f"# TYPE {p}_stage_seconds gauge",
+             f"# TYPE {p}_stage_calls gauge",
+             f"# TYPE {p}_stage_seconds_p50 gauge",
+             f"# TYPE {p}_stage_seconds_p95 gauge",
+             f"# TYPE {p}_counter gauge",
+             f"# TYPE {p}_run_seconds gauge",
+             f"# TYPE {p}_last_run_timestamp_seconds gauge"]
+    for name, stage in report["stages"].items():
+        lines.append(f'{p}_stage_seconds{{stage="{name}"}} {stage["total_s"]}')
+        lines.append(f'{p}_stage_calls{{stage="{name}"}} {stage["count"]}')
+    for name, pct in report["percentiles"].items():
+        lines.append(f'{p}_stage_seconds_p50{{stage="{name}"}} {pct["p50_s"]}')
+        lines.append(f'{p}_stage_seconds_p95{{stage="{name}"}} {pct["p95_s"]}')
+    for name, value in report["counters"].items():
+        lines.append(f'{p}_counter{{name="{name}"}} {value}')
+    lines.append(f"{p}_run_seconds {report['duration_s']}")
+    lines.append(f"{p}_last_run_timestamp_seconds {int(report['finished'])}")
+    os.makedirs(os.path.dirname(PROMETHEUS_FILE) or ".", exist_ok=True)
+    tmp = PROMETHEUS_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, PROMETHEUS_FILE)
+
+
+def write_report(extra=None):
+    """Įrašo paleidimo ataskaitą, papildo istoriją ir (jei įjungta)
+    Prometheus failą. extra - papildomi skyriai (pvz. paleidimo laikai)."""
+    finished = time.time()
+    report = {"started": round(_started, 3), "finished": round(finished, 3),
+              "duration_s": round(finished - _started, 3)}
+    report.update(snapshot())
+
+    history = _load_history(RUN_HISTORY_FILE)
+    history.append({"ts": report["finished"], "duration_s": report["duration_s"],
+                    "stages": {n: s["total_s"] for n, s in report["stages"].items()}})
+    history = history[-RUN_HISTORY_LIMIT:]
+
+    per_stage = {"run": [h["duration_s"] for h in history]}
+    for h in history:
+        for name, seconds in h["stages"].items():
+            per_stage.setdefault(name, []).append(seconds)
+    report["percentiles"] = {
+        name: {"runs": len(v), "p50_s": round(_percentile(v, 0.5), 4),
+               "p95_s": round(_percentile(v, 0.95), 4)}
+        for name, v in sorted(per_stage.items())
+    }
+    report.update(extra or {})
+
+    try:
+        _write_json(RUN_HISTORY_FILE, history)
+        _write_json(RUN_REPORT_FILE, report, indent=1, sort_keys=True)
+        if PROMETHEUS_ENABLED:
+            _prometheus(report)
+    except Exception as e:
+        logger.error(f"❌ Nepavyko įrašyti metrikų: {e}")
+        return report
+
+    slowest = sorted(report["stages"].items(), key=lambda kv: -kv[1]["total_s"])[:3]
+    logger.info(f"📊 Paleidimas {report['duration_s']:.1f} s; lėčiausios pakopos: " +
+                ", ".join(f"{n} {s['total_s']:.1f} s" for n, s in slowest))
+    return report
@@ -0,0 +1,116 @@
+# ====================================================================
+# MAKE OUTBOX: patvarus, asinchroninis webhook siuntimas
+#
+# Paruoštas payload'as pirma įrašomas į state.db outbox lentelę su
+# idempotency raktu (make:<posto ID>), o tik tada siunčiamas. Todėl:
+#   - nutrūkus paleidimui, kitas paleidimas tęsia TĄ PATĮ siuntimą
+#     (be naujo vertimo ir be naujo "kurį postą skelbti" sprendimo);
+#   - Make gauna Idempotency-Key antraštę ir gali atmesti dublikatus;
+#   - paskelbtu postas laikomas tik gavus 2xx atsakymą;
+#   - po OUTBOX_MAX_ATTEMPTS nesėkmių įrašas tampa "dead" ir nebeblokuoja
+#     eilės.
+# Kiekvienas bandymas (trukmė, HTTP kodas, klaida) rašomas į deliveries.
+# ====================================================================
+
+import os
+import time
+import asyncio
+import logging
+import httpx
+
+import metrics
+import http_retry
+
+logger = logging.getLogger(__name__)
+
+MAKE_WEBHOOK_URL = os.getenv("MAKE_WEBHOOK_URL")
+
+# Bandymai viename paleidime (trumpas laukimas tarp jų) ir iš viso
+ATTEMPTS_PER_RUN = 3
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 30.0
+RETRY_AFTER_MAX_SECONDS = 120.0
+# Kito paleidimo bandymas ne anksčiau kaip po (eksponentiškai augančio) laiko
+RETRY_BASE_SECONDS = 5 * 60
+RETRY_MAX_SECONDS = 6 * 60 * 60
+
+REQUEST_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+POOL_LIMITS = httpx.Limits(max_connections=4, max_keepalive_connections=2,
+                           keepalive_expiry=60.0)
+
+_pool = http_retry.ClientPool(REQUEST_TIMEOUT, POOL_LIMITS)
+
+
+async def aclose():
+    await _pool.aclose()
+
+
+def idempotency_key(post_id):
+    return f"make:{post_id}"
+
+
+def enqueue(store, post_id, channel, payload):
+    key = idempotency_key(post_id)
+    payload = dict(payload, idempotency_key=key)
+    return store.enqueue_outbox(key, post_id, channel, payload, time.time())
+
+
+def _next_retry_at(attempts, now):
+    runs = max(1, attempts // ATTEMPTS_PER_RUN)
+    return now + min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (runs - 1))
+
+
+async def deliver(store, entry):
+    """Bando pristatyti outbox įrašą. Grąžina "delivered", "pending" arba "dead"."""
+    if not MAKE_WEBHOOK_URL:
+        # Be URL nėra ko bandyti: atidedama kaip po nesėkmingo paleidimo, kad
+        # demonas nesuktų ciklo kas sekundę
+        logger.warning("⚠️ MAKE_WEBHOOK_URL nenustatytas - webhook atidedamas")
+        store.defer_outbox(entry, time.time() + RETRY_BASE_SECONDS,
+                           "MAKE_WEBHOOK_URL nenustatytas")
+        return "pending"
+
+    client = _pool.get()
+    headers = {"Idempotency-Key": entry["key"]}
+    attempt = entry["attempts"]
+    for run_attempt in range(1, ATTEMPTS_PER_RUN + 1):
+        attempt += 1
+        retry_after = None
+        http_status = None
+        started = time.monotonic()
+        metrics.count("make.attempts")
+        try:
+            with metrics.timer("make.deliver"):
+                r = await client.post(MAKE_WEBHOOK_URL, json=entry["payload"], headers=headers)
+            http_status = r.status_code
+            latency_ms = round((time.monotonic() - started) * 1000, 1)
+            if 200 <= r.status_code < 300:
+                store.mark_delivered(entry, attempt, time.time(), latency_ms, http_status)
+                logger.info(f"📨 Nusiųsta į Make: post {entry['post_id']} "
+                            f"(bandymas {attempt}, {latency_ms:.0f} ms)")
+                return "delivered"
+            error = f"HTTP {r.status_code}: {r.text[:200]}"
+            retryable = http_retry.is_retryable(r.status_code)
+            if r.status_code in (429, 503):
+                retry_after = http_retry.retry_after_seconds(r)
+        except Exception as e:
+            latency_ms = round((time.monotonic() - started) * 1000, 1)
+            error = f"{type(e).__name__}: {e}"
+            retryable = True
+
+        metrics.count("make.failures")
+        now = time.time()
+        dead = attempt >= MAX_ATTEMPTS
+        store.mark_failed(entry, attempt, now, latency_ms, http_status, error,
+                          _next_retry_at(attempt, now), dead=dead)
+        logger.warning(f"⚠️ Make bandymas {attempt} nepavyko: {error}")
+        if dead:
+            logger.error(f"☠️ Make: post {entry['post_id']} po {attempt} bandymų - dead-letter")
+            return "dead"
+        if not retryable or run_attempt == ATTEMPTS_PER_RUN:
+            break
+        await asyncio.sleep(http_retry.backoff_delay(
+            run_attempt, BACKOFF_BASE_SECONDS, BACKOFF_MAX_SECONDS,
+            retry_after, RETRY_AFTER_MAX_SECONDS))
+    return "pending"
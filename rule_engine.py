@@ -0,0 +1,134 @@
+# ====================================================================
+# SAUGIKLIO TAISYKLIŲ VARIKLIS
+#
+# Taisyklės (juodasis sąrašas, kirilica, nuorodos, hashtag'ai) laikomos
+# duomenų faile ir vieną kartą sukompiliuojamos į VIENĄ bendrą regex:
+#
+#   - paprastos frazės (be regex simbolių) sudedamos į prefiksų medį
+#     (trie) – jo tikrinimo laikas beveik nepriklauso nuo frazių skaičiaus,
+#     todėl juodasis sąrašas gali augti iki šimtų ar tūkstančių įrašų;
+#   - tikri regex'ai prijungiami kaip atskiros pavadintos alternatyvos.
+#
+# scan_batch() patikrina daug tekstų vienu regex praėjimu ir grąžina
+# struktūrizuotus radinius (taisyklės ID, tipas, pozicija tekste).
+# ====================================================================
+
+import re
+import json
+import bisect
+from typing import NamedTuple
+
+# Tekstų skirtukas paketiniam tikrinimui: jo neatitinka nei \w, nei \s,
+# todėl joks radinys negali persidengti per dviejų tekstų ribą
+_BATCH_SEPARATOR = "\x00"
+_REGEX_CHARS = set(".^$*+?{}[]\\|()")
+
+
+class Rule(NamedTuple):
+    id: str
+    kind: str
+    pattern: str
+    message: str
+
+
+class RuleMatch(NamedTuple):
+    rule_id: str
+    kind: str
+    start: int
+    end: int
+
+
+def _is_literal(pattern):
+    return not (set(pattern) & _REGEX_CHARS)
+
+
+def _trie_pattern(words):
+    """Frazių sąrašas -> regex be pavadintų grupių (ilgiausia frazė laimi)."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if "" in node:
+            return "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+class RuleEngine:
+    """Sukompiliuotas taisyklių rinkinys su vienu bendru regex."""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.by_id = {r.id: r for r in self.rules}
+        self.order = {r.id: i for i, r in enumerate(self.rules)}
+
+        literals = [r for r in self.rules if _is_literal(r.pattern)]
+        self.literal_rules = {r.pattern.lower(): r for r in literals}
+
+        alternatives = []
+        if literals:
+            alternatives.append(f"(?P<lit>{_trie_pattern(sorted(self.literal_rules))})")
+        self.group_rules = {}
+        for i, rule in enumerate(r for r in self.rules if not _is_literal(r.pattern)):
+            group = f"r{i}"
+            self.group_rules[group] = rule
+            alternatives.append(f"(?P<{group}>{rule.pattern})")
+
+        self.regex = re.compile("|".join(alternatives) or r"(?!x)x", re.IGNORECASE)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            Rule(id=r["id"], kind=r["kind"], pattern=r["pattern"],
+                 message=r.get("message") or f"juodojo sąrašo frazė: /{r['pattern']}/")
+            for r in data["rules"]
+        )
+
+    def _rule_for(self, m):
+        if m.lastgroup == "lit":
+            found = m.group("lit").lower()
+            rule = self.literal_rules.get(found)
+            if rule is None:
+                # Retas atvejis: IGNORECASE sulygino simbolį, kurio lower()
+                # nesutampa (pvz. "ſ" ir "s")
+                rule = next(r for key, r in self.literal_rules.items()
+                            if re.fullmatch(re.escape(key), found, re.IGNORECASE))
+            return rule
+        return self.group_rules[m.lastgroup]
+
+    def scan(self, text):
+        """Visi radiniai viename tekste (RuleMatch sąrašas)."""
+        matches = []
+        for m in self.regex.finditer(text):
+            rule = self._rule_for(m)
+            matches.append(RuleMatch(rule.id, rule.kind, m.start(), m.end()))
+        return matches
+
+    def scan_batch(self, texts):
+        """Daug tekstų vienu praėjimu. Grąžina radinių sąrašą kiekvienam
+        tekstui; pozicijos skaičiuojamos nuo to teksto pradžios."""
+        texts = list(texts)
+        starts = []
+        offset = 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + len(_BATCH_SEPARATOR)
+
+        results = [[] for _ in texts]
+        for m in self.regex.finditer(_BATCH_SEPARATOR.join(texts)):
+            i = bisect.bisect_right(starts, m.start()) - 1
+            rule = self._rule_for(m)
+            results[i].append(RuleMatch(rule.id, rule.kind,
+                                        m.start() - starts[i], m.end() - starts[i]))
+        return results
@@ -0,0 +1,170 @@
+# ====================================================================
+# SKELBIMO PLANUOKLIS (slotai, token bucket, tylos valandos)
+#
+# Vietoj "1 video per paleidimą, jei praėjo valanda" skaičiuojamas tikslus
+# kito skelbimo laikas (slotas):
+#   - token bucket (GCRA): vidutiniškai 1 video per PUBLISH_INTERVAL_SECONDS,
+#     bet iki PUBLISH_BURST video gali išeiti iš karto, jei buvo pertrauka;
+#   - slotai "pririšti" prie grafiko: cron'o vėlavimas iki
+#     PUBLISH_SLOT_GRACE_SECONDS nepastumia kitų slotų (intervalas
+#     nebeauga iki 60-75 min.). Tarpas po vėluojančio posto tada gali
+#     sutrumpėti iki PUBLISH_INTERVAL_SECONDS - grace, todėl taikoma tik
+#     kai PUBLISH_BURST > 1. Su PUBLISH_BURST=1 (numatyta) galioja griežta
+#     senoji riba: ne dažniau kaip 1 video per PUBLISH_INTERVAL_SECONDS
+#     nuo paskutinio posto (demono režime slotai tikslūs, tad ir nevėluoja);
+#   - tylos valandos (PUBLISH_QUIET_HOURS="23-7") - slotas nukeliamas į
+#     tylos pabaigą;
+#   - prioritetas (PUBLISH_PRIORITIES="kanalas=2,kitas=1") ir senėjimas:
+#     senesni nei VIDEO_MAX_AGE_HOURS video išmetami iš eilės.
+#
+# Skaičiuojama tik iš patvirtintų pristatymų laikų (state.db), todėl
+# planą galima pažiūrėti nepaleidžiant konvejerio: python main.py --plan
+# ====================================================================
+
+import os
+import datetime
+import itertools
+from zoneinfo import ZoneInfo
+
+PUBLISH_INTERVAL_SECONDS = int(os.getenv("PUBLISH_INTERVAL_SECONDS", str(60 * 60)))
+PUBLISH_BURST = max(1, int(os.getenv("PUBLISH_BURST", "1")))
+PUBLISH_SLOT_GRACE_SECONDS = int(os.getenv("PUBLISH_SLOT_GRACE_SECONDS", str(15 * 60)))
+PUBLISH_QUIET_HOURS = os.getenv("PUBLISH_QUIET_HOURS", "")
+PUBLISH_TZ = ZoneInfo(os.getenv("PUBLISH_TZ", "Europe/Vilnius"))
+VIDEO_MAX_AGE_HOURS = float(os.getenv("VIDEO_MAX_AGE_HOURS", "72"))  # 0 - neriboti
+
+# Kiek paskutinių pristatymų imama token bucket būsenai atkurti
+DELIVERY_HISTORY = PUBLISH_BURST + 10
+
+
+def _parse_priorities(spec):
+    priorities = {}
+    for part in spec.split(","):
+        if "=" in part:
+            channel, value = part.split("=", 1)
+            priorities[channel.strip()] = int(value)
+    return priorities
+
+
+def _parse_quiet_hours(spec):
+    if not spec.strip():
+        return None
+    start, end = spec.split("-", 1)
+    return int(start) % 24, int(end) % 24
+
+
+CHANNEL_PRIORITIES = _parse_priorities(os.getenv("PUBLISH_PRIORITIES", ""))
+QUIET_HOURS = _parse_quiet_hours(PUBLISH_QUIET_HOURS)
+
+
+def priority_for(channel):
+    return CHANNEL_PRIORITIES.get(channel, 0)
+
+
+def format_ts(ts):
+    return datetime.datetime.fromtimestamp(ts, PUBLISH_TZ).strftime("%Y-%m-%d %H:%M")
+
+
+# ---------------- tylos valandos ----------------
+def _in_quiet_hours(ts):
+    if not QUIET_HOURS:
+        return False
+    start, end = QUIET_HOURS
+    hour = datetime.datetime.fromtimestamp(ts, PUBLISH_TZ).hour
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def _after_quiet_hours(ts):
+    """Jei ts patenka į tylos valandas - grąžina tylos pabaigos laiką."""
+    if not _in_quiet_hours(ts):
+        return ts
+    local = datetime.datetime.fromtimestamp(ts, PUBLISH_TZ)
+    end = local.replace(hour=QUIET_HOURS[1], minute=0, second=0, microsecond=0)
+    if end <= local:
+        end += datetime.timedelta(days=1)
+    return end.timestamp()
+
+
+# ---------------- token bucket ----------------
+def _theoretical_arrival(publish_times):
+    """GCRA: "teorinis" kito posto laikas pagal ankstesnių postų laikus."""
+    tat = 0.0
+    for t in sorted(publish_times):
+        # Vėlavimas slotui neprailgina grafiko, jei neviršija grace laiko
+        anchored = tat <= t <= tat + PUBLISH_SLOT_GRACE_SECONDS
+        tat = (tat if anchored else max(tat, t)) + PUBLISH_INTERVAL_SECONDS
+    return tat
+
+
+def _slot(publish_times, now):
+    tolerance = (PUBLISH_BURST - 1) * PUBLISH_INTERVAL_SECONDS
+    slot = max(now, _theoretical_arrival(publish_times) - tolerance)
+    if PUBLISH_BURST == 1 and publish_times:
+        # Griežta riba: pririšimas prie grafiko tarpo netrumpina
+        slot = max(slot, max(publish_times) + PUBLISH_INTERVAL_SECONDS)
+    return _after_quiet_hours(slot)
+
+
+def _publish_times(store):
+    times = set(store.recent_delivery_times(DELIVERY_HISTORY))
+    last = store.last_sent_ts()  # ir seni (prieš outbox) paskelbimai
+    if last:
+        times.add(last)
+    return sorted(times)[-DELIVERY_HISTORY:]
+
+
+def next_slot(store, now):
+    """Anksčiausias laikas, kada galima skelbti kitą video."""
+    return _slot(_publish_times(store), now)
+
+
+# ---------------- eilės tvarka ----------------
+def _fair_order(queue, store, default_channel):
+    # Kanalai keičiasi ratu (pirmas - seniausiai skelbęs kanalas), o kanalo
+    # viduje seniausias video pirmas (FB tvarka lieka chronologinė)
+    by_channel = {}
+    for video in sorted(queue, key=lambda v: v["ts"]):
+        by_channel.setdefault(video.get("channel", default_channel), []).append(video)
+    channels = sorted(by_channel, key=lambda c: (store.last_sent_ts(c), by_channel[c][0]["ts"]))
+    ordered = []
+    for round_ in itertools.zip_longest(*(by_channel[c] for c in channels)):
+        ordered.extend(v for v in round_ if v is not None)
+    return ordered
+
+
+def order(queue, store, default_channel):
+    """Skelbimo tvarka: didesnis prioritetas pirma, tada kanalai ratu."""
+    ordered = _fair_order(queue, store, default_channel)
+    ordered.sort(key=lambda v: -v.get("priority", 0))  # stabilus rikiavimas
+    return ordered
+
+
+def is_expired(video, at):
+    if VIDEO_MAX_AGE_HOURS <= 0:
+        return False
+    return at - video["ts"] > VIDEO_MAX_AGE_HOURS * 3600
+
+
+def drop_expired(queue, now):
+    """Išima per senus video iš eilės (vietoje). Grąžina išmestus."""
+    expired = [v for v in queue if is_expired(v, now)]
+    if expired:
+        queue[:] = [v for v in queue if not is_expired(v, now)]
+    return expired
+
+
+def plan(queue, store, now, default_channel, limit=24):
+    """Kas ir kada bus paskelbta: [(laikas, video, "publish" / "expire")].
+    Simuliuojama su dabartine eile, be naujų postų ir be nesėkmių."""
+    times = _publish_times(store)
+    rows = []
+    for video in order(queue, store, default_channel)[:limit]:
+        slot = _slot(times, now)
+        if is_expired(video, slot):
+            rows.append((slot, video, "expire"))
+            continue
+        rows.append((slot, video, "publish"))
+        times.append(slot)
+    return rows
@@ -0,0 +1,358 @@
+# ====================================================================
+# BŪSENOS SAUGYKLA (SQLite, WAL režimas)
+#
+# Vienas transakcinis failas docs/state.db vietoj išmėtytų JSON failų:
+#   meta  – checkpoint'ai ir paskutinio posto laikas (raktas -> reikšmė);
+#           kiekvienas kanalas turi savo "checkpoint:<kanalas>" raktą
+#   sent  – jau paskelbti postai (PRIMARY KEY -> indeksuota paieška,
+#           jokios 200 įrašų ribos, senas postas nebus paskelbtas dar kartą)
+#   queue – dar nepaskelbti video su jų duomenimis (JSON)
+#   outbox – Make siuntimai su idempotency raktu ir būsena
+#           (pending -> delivered / dead)
+#   deliveries – kiekvieno pristatymo bandymo istorija (trukmė, HTTP kodas)
+#   media_failures – postai, kurių medija nepavyko (kiek paleidimų iš eilės)
+#
+# Kiekvienas pakeitimas – atomiška transakcija, todėl nutrūkęs paleidimas
+# negali palikti pusiau įrašytos būsenos. Pirmą kartą atidarius, seni
+# JSON failai vieną kartą perkeliami į DB ir pašalinami.
+# ====================================================================
+
+import os
+import json
+import time
+import sqlite3
+import pathlib
+import logging
+import contextlib
+
+logger = logging.getLogger(__name__)
+
+STATE_DB = "docs/state.db"
+
+# Seni JSON failai, perkeliami vieną kartą
+LEGACY_LAST_POST_FILE = "docs/last_post.json"
+LEGACY_SENT_FILE = "docs/sent_to_make.json"
+LEGACY_LAST_SENT_FILE = "docs/last_sent.json"
+LEGACY_QUEUE_FILE = "docs/queue.json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sent (
+    post_id TEXT PRIMARY KEY,
+    sent_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS queue (
+    post_id TEXT PRIMARY KEY,
+    ts      REAL NOT NULL,
+    data    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS queue_ts ON queue (ts);
+CREATE TABLE IF NOT EXISTS outbox (
+    key          TEXT PRIMARY KEY,
+    post_id      TEXT NOT NULL,
+    channel      TEXT,
+    payload      TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    created_at   REAL NOT NULL,
+    next_at      REAL NOT NULL,
+    last_error   TEXT,
+    delivered_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, created_at);
+CREATE TABLE IF NOT EXISTS deliveries (
+    key         TEXT NOT NULL,
+    attempt     INTEGER NOT NULL,
+    at          REAL NOT NULL,
+    latency_ms  REAL NOT NULL,
+    http_status INTEGER,
+    error       TEXT
+);
+CREATE TABLE IF NOT EXISTS media_failures (
+    post_id    TEXT PRIMARY KEY,
+    attempts   INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+OUTBOX_COLUMNS = ("key", "post_id", "channel", "payload", "status", "attempts",
+                  "created_at", "next_at", "last_error", "delivered_at")
+
+
+def _read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"❌ {path} sugadintas, perkeliant praleidžiamas: {e}")
+        return default
+
+
+class StateStore:
+    """Transakcinė paleidimų būsena (checkpoint, paskelbti postai, eilė)."""
+
+    def __init__(self, path=STATE_DB, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        if readonly:
+            # Tik skaitymas (python main.py --plan): jokios schemos, perkėlimo
+            # ar naujo failo - FileNotFoundError, jei būsenos dar nėra
+            if not os.path.exists(path):
+                raise FileNotFoundError(path)
+            uri = pathlib.Path(path).resolve().as_uri() + "?mode=ro"
+            self.db = sqlite3.connect(uri, uri=True, isolation_level=None)
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # isolation_level=None - transakcijas valdome patys (BEGIN IMMEDIATE)
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=FULL")
+        self.db.executescript(SCHEMA)
+        self._migrate_legacy_json()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.db
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    def flush(self):
+        # WAL turinys perkeliamas į pagrindinį failą - į git patenka vienas
+        # pilnas state.db be -wal/-shm failų
+        self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        if not self.readonly:
+            self.flush()
+        self.db.close()
+
+    # ---------------- meta ----------------
+    def get_meta(self, key, default=None):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, db, key, value):
+        db.execute("INSERT INTO meta (key, value) VALUES (?, ?) "
+                   "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                   (key, json.dumps(value)))
+
+    def set_meta(self, key, value):
+        with self.transaction() as db:
+            self._set_meta(db, key, value)
+
+    @staticmethod
+    def _channel_key(name, channel):
+        # channel=None - senasis (vieno kanalo) raktas be priesagos
+        return name if channel is None else f"{name}:{channel}"
+
+    def get_checkpoint(self, channel=None):
+        return int(self.get_meta(self._channel_key("checkpoint", channel), 0))
+
+    def set_checkpoint(self, message_id, channel=None):
+        self.set_meta(self._channel_key("checkpoint", channel), int(message_id))
+
+    def last_sent_ts(self, channel=None):
+        """Paskutinio posto laikas: bendras arba konkretaus kanalo."""
+        return float(self.get_meta(self._channel_key("last_sent_ts", channel), 0.0))
+
+    # ---------------- paskelbti postai ----------------
+    def is_sent(self, post_id):
+        return self.db.execute("SELECT 1 FROM sent WHERE post_id = ?",
+                               (str(post_id),)).fetchone() is not None
+
+    def _mark_sent(self, db, post_id, ts, channel=None):
+        db.execute("INSERT OR REPLACE INTO sent (post_id, sent_at) VALUES (?, ?)",
+                   (str(post_id), ts))
+        self._set_meta(db, "last_sent_ts", ts)
+        if channel is not None:
+            self._set_meta(db, self._channel_key("last_sent_ts", channel), ts)
+        db.execute("DELETE FROM queue WHERE post_id = ?", (str(post_id),))
+
+    # ---------------- Make outbox ----------------
+    def _outbox_row(self, row):
+        if row is None:
+            return None
+        entry = dict(zip(OUTBOX_COLUMNS, row))
+        entry["payload"] = json.loads(entry["payload"])
+        return entry
+
+    def get_outbox(self, key):
+        row = self.db.execute(f"SELECT {', '.join(OUTBOX_COLUMNS)} FROM outbox WHERE key = ?",
+                              (key,)).fetchone()
+        return self._outbox_row(row)
+
+    def next_outbox(self):
+        """Seniausias dar nepristatytas (pending) įrašas arba None."""
+        row = self.db.execute(f"SELECT {', '.join(OUTBOX_COLUMNS)} FROM outbox "
+                              "WHERE status = 'pending' ORDER BY created_at LIMIT 1").fetchone()
+        return self._outbox_row(row)
+
+    def enqueue_outbox(self, key, post_id, channel, payload, now):
+        """Įdeda siuntimą į outbox. Tas pats raktas antrą kartą nededamas -
+        grąžinamas jau esantis įrašas."""
+        with self.transaction() as db:
+            db.execute("INSERT OR IGNORE INTO outbox (key, post_id, channel, payload, status, "
+                       "created_at, next_at) VALUES (?, ?, ?, ?, 'pending', ?, ?)",
+                       (key, str(post_id), channel,
+                        json.dumps(payload, ensure_ascii=False, sort_keys=True), now, now))
+        return self.get_outbox(key)
+
+    def _record_attempt(self, db, key, attempt, at, latency_ms, http_status, error):
+        db.execute("INSERT INTO deliveries (key, attempt, at, latency_ms, http_status, error) "
+                   "VALUES (?, ?, ?, ?, ?, ?)",
+                   (key, attempt, at, latency_ms, http_status, error))
+
+    def mark_delivered(self, entry, attempt, at, latency_ms, http_status):
+        """Viena transakcija: pristatymas patvirtintas, postas paskelbtas,
+        laikas atnaujintas, video išimtas iš eilės. Arba visa tai, arba nieko."""
+        with self.transaction() as db:
+            self._record_attempt(db, entry["key"], attempt, at, latency_ms, http_status, None)
+            db.execute("UPDATE outbox SET status = 'delivered', attempts = ?, delivered_at = ?, "
+                       "last_error = NULL WHERE key = ?", (attempt, at, entry["key"]))
+            self._mark_sent(db, entry["post_id"], at, entry["channel"])
+
+    def mark_failed(self, entry, attempt, at, latency_ms, http_status, error,
+                    next_at, dead=False):
+        """Nepavykęs bandymas. dead=True - įrašas perkeliamas į dead-letter
+        būseną, o video išimamas iš eilės (paskelbtu nelaikomas)."""
+        with self.transaction() as db:
+            self._record_attempt(db, entry["key"], attempt, at, latency_ms, http_status, error)
+            db.execute("UPDATE outbox SET status = ?, attempts = ?, next_at = ?, last_error = ? "
+                       "WHERE key = ?",
+                       ("dead" if dead else "pending", attempt, next_at, error, entry["key"]))
+            if dead:
+                db.execute("DELETE FROM queue WHERE post_id = ?", (entry["post_id"],))
+
+    def defer_outbox(self, entry, next_at, error):
+        """Atideda siuntimą nebandžius siųsti (pvz. nesukonfigūruotas webhook):
+        bandymas neskaičiuojamas, todėl įrašas dėl to netampa "dead"."""
+        with self.transaction() as db:
+            db.execute("UPDATE outbox SET next_at = ?, last_error = ? WHERE key = ?",
+                       (next_at, error, entry["key"]))
+
+    def recent_delivery_times(self, limit):
+        """Paskutinių patvirtintų pristatymų laikai (naujausias pirmas)."""
+        rows = self.db.execute("SELECT delivered_at FROM outbox WHERE status = 'delivered' "
+                               "ORDER BY delivered_at DESC LIMIT ?", (limit,)).fetchall()
+        return [at for (at,) in rows]
+
+    def delivery_stats(self, since):
+        """Pristatymų suvestinė nuo laiko `since`: bandymai, vidutinė ir
+        maksimali trukmė, pristatyti ir dead-letter įrašai."""
+        attempts, avg_ms, max_ms = self.db.execute(
+            "SELECT COUNT(*), AVG(latency_ms), MAX(latency_ms) FROM deliveries WHERE at >= ?",
+            (since,)).fetchone()
+        by_status = dict(self.db.execute(
+            "SELECT status, COUNT(*) FROM outbox WHERE created_at >= ? GROUP BY status",
+            (since,)).fetchall())
+        return {"attempts": attempts, "avg_latency_ms": round(avg_ms or 0, 1),
+                "max_latency_ms": round(max_ms or 0, 1),
+                "delivered": by_status.get("delivered", 0),
+                "pending": by_status.get("pending", 0), "dead": by_status.get("dead", 0)}
+
+    # ---------------- nepavykusi medija ----------------
+    def record_media_failures(self, post_ids, now):
+        """+1 nesėkmė kiekvienam postui. Grąžina {post_id: nesėkmių iš viso}."""
+        post_ids = [str(post_id) for post_id in post_ids]
+        if not post_ids:
+            return {}
+        with self.transaction() as db:
+            db.executemany("INSERT INTO media_failures (post_id, attempts, updated_at) "
+                           "VALUES (?, 1, ?) ON CONFLICT(post_id) DO UPDATE SET "
+                           "attempts = attempts + 1, updated_at = excluded.updated_at",
+                           [(post_id, now) for post_id in post_ids])
+            rows = db.execute(f"SELECT post_id, attempts FROM media_failures WHERE post_id IN "
+                              f"({', '.join('?' * len(post_ids))})", post_ids).fetchall()
+        return dict(rows)
+
+    def clear_media_failures(self, post_ids):
+        post_ids = [str(post_id) for post_id in post_ids]
+        if not post_ids or not self.db.execute("SELECT 1 FROM media_failures LIMIT 1").fetchone():
+            return  # dažniausias atvejis - nieko nerašom
+        with self.transaction() as db:
+            db.executemany("DELETE FROM media_failures WHERE post_id = ?",
+                           [(post_id,) for post_id in post_ids])
+
+    # ---------------- eilė ----------------
+    def load_queue(self):
+        rows = self.db.execute("SELECT data FROM queue ORDER BY ts, post_id").fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def _queue_changed(self, rows):
+        current = self.db.execute("SELECT post_id, ts, data FROM queue").fetchall()
+        return sorted(current) != sorted(rows)
+
+    @staticmethod
+    def _queue_rows(queue):
+        return [(v["id"], v["ts"], json.dumps(v, ensure_ascii=False, sort_keys=True))
+                for v in queue]
+
+    def _replace_queue(self, db, rows):
+        db.execute("DELETE FROM queue")
+        db.executemany("INSERT INTO queue (post_id, ts, data) VALUES (?, ?, ?)", rows)
+
+    def save_queue(self, queue):
+        rows = self._queue_rows(queue)
+        if not self._queue_changed(rows):
+            return  # nieko nepasikeitė - DB failas neliečiamas
+        with self.transaction() as db:
+            self._replace_queue(db, rows)
+
+    def save_ingest(self, checkpoints, queue):
+        """Visų kanalų checkpoint'ai ({kanalas: ID}) ir eilė įrašomi kartu:
+        nutrūkus paleidimui negali likti pasislinkusio checkpoint'o be į
+        eilę įdėtų video."""
+        rows = self._queue_rows(queue)
+        changed = {channel: int(message_id) for channel, message_id in checkpoints.items()
+                   if int(message_id) != self.get_checkpoint(channel)}
+        queue_changed = self._queue_changed(rows)
+        if not changed and not queue_changed:
+            return
+        with self.transaction() as db:
+            for channel, message_id in changed.items():
+                self._set_meta(db, self._channel_key("checkpoint", channel), message_id)
+            if queue_changed:
+                self._replace_queue(db, rows)
+
+    # ---------------- vienkartinis perkėlimas ----------------
+    def _migrate_legacy_json(self):
+        if self.get_meta("migrated_json"):
+            return
+        last_post = _read_json(LEGACY_LAST_POST_FILE, {})
+        sent_ids = _read_json(LEGACY_SENT_FILE, [])
+        last_sent = _read_json(LEGACY_LAST_SENT_FILE, {})
+        queue = _read_json(LEGACY_QUEUE_FILE, [])
+
+        with self.transaction() as db:
+            if last_post.get("id"):
+                self._set_meta(db, "checkpoint", int(last_post["id"]))
+                # Senoji versija eilės nesaugojo (queue.json produkcijoje nebuvo) -
+                # ją kas kartą atkurdavo iš paskutinių žinučių. Be šios žymos
+                # nepaskelbti video prieš checkpoint'ą būtų prarasti.
+                if not queue:
+                    self._set_meta(db, "queue_bootstrap", True)
+            if last_sent.get("ts"):
+                self._set_meta(db, "last_sent_ts", float(last_sent["ts"]))
+            now = time.time()
+            db.executemany("INSERT OR IGNORE INTO sent (post_id, sent_at) VALUES (?, ?)",
+                           [(str(post_id), now) for post_id in sent_ids])
+            db.executemany("INSERT OR IGNORE INTO queue (post_id, ts, data) VALUES (?, ?, ?)",
+                           [(v["id"], v["ts"], json.dumps(v, ensure_ascii=False, sort_keys=True))
+                            for v in queue if "ts" in v])
+            self._set_meta(db, "migrated_json", True)
+
+        for path in (LEGACY_LAST_POST_FILE, LEGACY_SENT_FILE,
+                     LEGACY_LAST_SENT_FILE, LEGACY_QUEUE_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+        logger.info(f"📦 Būsena perkelta į {self.path}: {len(sent_ids)} paskelbtų, "
+                    f"{len(queue)} eilėje, checkpoint {last_post.get('id', 0)}")
@@ -11,13 +11,29 @@
 #               nuorodos, hashtag'ai). Jei praslydo – dar vienas
 #               bandymas "tik faktai", o jei ir tada blogai –
 #               postas be teksto + pranešimas į Telegram.
+#
+# Kiekvienos pakopos rezultatas saugomas diske (TranslationCache), todėl
+# pakartotinis to paties teksto vertimas nekainuoja nė vieno skambučio,
+# o nutrūkęs vertimas tęsiamas nuo paskutinės pavykusios pakopos.
+#
+# Kai verčiama keletas postų iš karto (translate_batch_async), analizė ir
+# peržiūra siunčiamos bendrais JSON skambučiais (žr. _StageBatch), o
+# rašymas, saugiklis ir griežtas perrašymas lieka kiekvienam postui atskirai.
 # ====================================================================
 
+import os
 import re
 import json
 import time
+import asyncio
+import hashlib
+import contextvars
 import logging
-import requests
+import httpx
+
+import metrics
+import http_retry
+from rule_engine import RuleEngine
 
 logger = logging.getLogger(__name__)
 
@@ -92,6 +108,14 @@ A correct, slightly duller post always beats a clever, wrong one.
 C. LANGUAGE
 Only real, commonly used Lithuanian words that exist in a dictionary. No neologisms, no transliterations, no calques. Short, simple sentences. A reader who does not follow the war must understand every word."""
 
+# Griežtas perrašymas (saugikliui kritus): WRITE_PROMPT + papildoma pabaiga,
+# todėl sistemos prompto pradžia sutampa ir pasiekia DeepSeek prompt cache
+STRICT_PROMPT = WRITE_PROMPT + (
+    "\n\nD. STRICT MODE — the previous attempt failed a safety check. "
+    "Throw away ALL irony, jokes and wordplay. Write only the plain facts "
+    "in the simplest possible Lithuanian. Nothing clever. Nothing borrowed "
+    "from the original's imagery.")
+
 
 # --------------------------------------------------------------------
 # 3 PAKOPA: PERŽIŪRA
@@ -119,41 +143,385 @@ CHECKLIST — mark ok:false if ANY of these fail:
 "final" must ALWAYS contain a publishable post — fix the problems yourself. Never return an empty "final"."""
 
 
+# --------------------------------------------------------------------
+# 1+2 PAKOPA SUJUNGTA: trumpiems, paprastiems postams analizė ir rašymas
+# vienu skambučiu. Jei modelis pats įvertina riziką kaip ne "low" arba
+# randa žargono - jo analizė naudojama toliau pilnoje grandinėje.
+# --------------------------------------------------------------------
+MERGED_PROMPT = """You receive a single SHORT news item from a Ukrainian Telegram war channel (Ukrainian or Russian).
+Do two things in one answer: analyse it, then write a Lithuanian Facebook post from your analysis.
+
+Return STRICT JSON, nothing else, in exactly this shape:
+
+{
+  "facts": "A plain, literal, unemotional statement of what actually happened. No metaphors, no irony, no jokes.",
+  "expressions": [
+    {"original": "...", "literal": "...", "meaning": "...", "lt_natural": "... or null", "safe_in_lt": true or false}
+  ],
+  "tone": "neutral | ironic | mocking | dramatic",
+  "risk": "low | medium | high",
+  "post": "the ready-to-publish Lithuanian post"
+}
+
+ANALYSIS
+- List EVERY slang word, idiom, irony, euphemism, abbreviation or wordplay in "expressions". If there is none, return an empty list.
+- "risk" is "low" ONLY if the item is plain, literal news with nothing that could be mistranslated. If in doubt, it is not "low".
+
+THE POST
+1. Begin with a short notice that this is the latest news from Ukraine.
+2. Build the post on "facts" only. Add nothing that is not there.
+3. Russia and its actions are aggression; Ukraine is the defending country. Never reproduce the aggressor's framing.
+4. No links, no URLs, no invitations to follow other channels.
+5. Keep emojis from the source. End with 3-5 Lithuanian hashtags.
+6. Only real, commonly used Lithuanian words. No neologisms, transliterations or calques. Short, simple sentences.
+7. Never carry a foreign joke or image across literally. A correct, slightly duller post always beats a clever, wrong one."""
+
+
+# --------------------------------------------------------------------
+# PAKETINIS REŽIMAS: prie ANALYZE_PROMPT / REVIEW_PROMPT pridedama
+# pabaiga, todėl pagrindinė prompto dalis lieka ta pati (ir tas pats
+# DeepSeek prompt cache prefiksas), o atsakymas - vienas JSON visiems postams.
+# --------------------------------------------------------------------
+BATCH_SUFFIX = """
+
+BATCH MODE
+You receive several independent items as JSON: {"items": [{"id": "...", ...}, ...]}.
+Handle every item on its own, exactly as described above, as if it were the only one. Never mix facts, names or numbers between items.
+Return STRICT JSON, nothing else: {"results": [{"id": "<the item's id>", ...the object described above...}, ...]} with exactly one result per item."""
+
+
 # --------------------------------------------------------------------
 # DETERMINISTINIS SAUGIKLIS
 # --------------------------------------------------------------------
-BANNED_PATTERNS = [
-    r"prilytim",                 # прильот -> "prilytimas"
-    r"[šs]achid",                # šachidas (turi būti šachedas)
-    r"bojepripais",
-    r"antipersonines\s+minas",
-    r"Pta[čc]i[ųu]\s+Madyaro",
-    r"medviln",                  # бавовна pažodžiui
-    r"du\s*[šs]imtas\w*\s+kar",  # двохсотий pažodžiui
-]
+# Taisyklės laikomos hard_check_rules.json ir sukompiliuojamos vieną kartą
+# (žr. rule_engine.py). Naujai frazei į juodąjį sąrašą kodo keisti nereikia.
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hard_check_rules.json")
+RULES = RuleEngine.from_file(RULES_FILE)
+BANNED_PATTERNS = [r.pattern for r in RULES.rules if r.kind == "banned"]
 
-def hard_check(text):
-    """Grąžina problemų sąrašą. Tuščias sąrašas = tekstas švarus."""
-    problems = []
+# Pažeidimai, kurių tolesnis tekstas jau nebeištaisys
+DEFINITIVE_KINDS = ("cyrillic", "link", "banned")
+MIN_HASHTAGS = 3
+
+
+def _problems(matches, kinds):
+    # Kiekviena taisyklė pranešama vieną kartą, taisyklių failo tvarka
+    hit = {m.rule_id for m in matches if m.kind in kinds}
+    return [RULES.by_id[rid].message for rid in sorted(hit, key=RULES.order.get)]
+
+
+def _check(text, matches):
     if not text or len(text.strip()) < 30:
-        problems.append("tekstas tuščias arba per trumpas")
-        return problems
-    if re.search(r"[Ѐ-ӿ]", text):
-        problems.append("likusi kirilica (neišverstas fragmentas)")
-    if re.search(r"https?://|www\.", text, re.I):
-        problems.append("poste liko nuoroda")
-    if len(re.findall(r"#\w+", text)) < 3:
+        return ["tekstas tuščias arba per trumpas"]
+    problems = _problems(matches, ("cyrillic", "link"))
+    if sum(1 for m in matches if m.kind == "hashtag") < MIN_HASHTAGS:
         problems.append("mažiau nei 3 hashtag'ai")
-    for pat in BANNED_PATTERNS:
-        if re.search(pat, text, re.I):
-            problems.append(f"juodojo sąrašo frazė: /{pat}/")
-    return problems
+    return problems + _problems(matches, ("banned",))
+
+
+def hard_check(text):
+    """Grąžina problemų sąrašą. Tuščias sąrašas = tekstas švarus."""
+    return _check(text, RULES.scan(text) if text else [])
+
+
+def hard_check_batch(texts):
+    """hard_check daugeliui tekstų vienu taisyklių praėjimu."""
+    texts = list(texts)
+    return [_check(t, m) for t, m in zip(texts, RULES.scan_batch(t or "" for t in texts))]
+
+
+def definitive_violations(text):
+    """Saugiklio pažeidimai, kurių tolesnis tekstas jau nebeištaisys
+    (kirilica, nuoroda, juodojo sąrašo frazė). Naudojama srautui nutraukti."""
+    return _problems(RULES.scan(text), DEFINITIVE_KINDS)
+
+
+# --------------------------------------------------------------------
+# ADAPTYVUS REŽIMAS IR JO STATISTIKA
+#   merged – trumpas postas, analizė + rašymas vienu skambučiu, be peržiūros
+#   fast   – maža rizika, nėra žargono: analizė + rašymas, be peržiūros
+#   full   – visa grandinė (analizė, rašymas, peržiūra)
+# Kiekvienam režimui kaupiama trukmė ir saugiklio kritimų dažnis, kad
+# būtų matyti, ar greitas kelias neblogina kokybės.
+# --------------------------------------------------------------------
+ADAPTIVE_MODE = os.getenv("TRANSLATE_ADAPTIVE", "1") == "1"
+
+# Srautinis režimas (stream=True) tekstinėms pakopoms (rašymas, griežtas
+# perrašymas): juodraštis tikrinamas jau ateinant žetonams ir, radus
+# neabejotiną pažeidimą, užklausa nutraukiama - iškart einama į griežtą režimą
+STREAM_MODE = os.getenv("TRANSLATE_STREAM", "1") == "1"
+STREAM_CHECK_WINDOW = 80
+MERGED_MAX_CHARS = 280
+STATS_FILE = "docs/translation_stats.json"
+
+
+def _update_stats(name, update, path=STATS_FILE):
+    stats = {}
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                stats = json.load(f)
+        except Exception as e:
+            logger.error(f"❌ {path} sugadintas, kuriamas naujas: {e}")
+    update(stats.setdefault(name, {}))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(stats, f, indent=1)
+
+
+def record_mode_stats(mode, seconds, ok, hard_check_failed, tokens=None):
+    def update(s):
+        for field in ("runs", "failed", "hard_check_failed"):
+            s.setdefault(field, 0)
+        s["runs"] += 1
+        s["seconds"] = round(s.get("seconds", 0.0) + seconds, 3)
+        s["failed"] += 0 if ok else 1
+        s["hard_check_failed"] += 1 if hard_check_failed else 0
+        s["avg_seconds"] = round(s["seconds"] / s["runs"], 3)
+        s["hard_check_fail_rate"] = round(s["hard_check_failed"] / s["runs"], 4)
+        for field, value in (tokens or {}).items():
+            s[field] = round(s.get(field, 0) + value, 1)
+            s[f"avg_{field}"] = round(s[field] / s["runs"], 1)
+    _update_stats(mode, update)
+
+
+def record_stream_stats(stage, ttft, total, aborted):
+    # Srautinių pakopų laikai: iki pirmo žetono (TTFT) ir viso srauto
+    def update(s):
+        for field in ("streams", "aborted"):
+            s.setdefault(field, 0)
+        s["streams"] += 1
+        s["aborted"] += 1 if aborted else 0
+        s["ttft_seconds"] = round(s.get("ttft_seconds", 0.0) + (ttft or 0.0), 3)
+        s["total_seconds"] = round(s.get("total_seconds", 0.0) + total, 3)
+        s["avg_ttft_seconds"] = round(s["ttft_seconds"] / s["streams"], 3)
+        s["avg_total_seconds"] = round(s["total_seconds"] / s["streams"], 3)
+    _update_stats(f"stream:{stage}", update)
+
+
+# --------------------------------------------------------------------
+# VERTIMŲ CACHE
+# --------------------------------------------------------------------
+CACHE_FILE = "docs/translation_cache.json"
+CACHE_MAX_ENTRIES = 500
+CACHE_MAX_AGE_SECONDS = 14 * 24 * 60 * 60
+
+# Pasikeitus bet kuriam promptui, seni įrašai nebetinka (kitas raktas)
+PROMPT_VERSION = hashlib.sha256(
+    "\x00".join([ANALYZE_PROMPT, WRITE_PROMPT, REVIEW_PROMPT, MERGED_PROMPT,
+                 BATCH_SUFFIX]).encode("utf-8")
+).hexdigest()[:12]
+
+
+class TranslationCache:
+    """Vertimo pakopų rezultatai diske: raktas -> {pakopa: rezultatas}."""
+
+    def __init__(self, path=CACHE_FILE, max_entries=CACHE_MAX_ENTRIES,
+                 max_age=CACHE_MAX_AGE_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self.entries = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                logger.error(f"❌ {path} sugadintas, kuriamas naujas: {e}")
+
+    @staticmethod
+    def key(source_text):
+        raw = "\x00".join([DEEPSEEK_MODEL, PROMPT_VERSION, source_text])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key, stage):
+        entry = self.entries.get(key)
+        if entry and stage in entry["stages"] and time.time() - entry["ts"] <= self.max_age:
+            self.hits += 1
+            return entry["stages"][stage]
+        self.misses += 1
+        return None
+
+    def put(self, key, stage, value):
+        entry = self.entries.setdefault(key, {"ts": time.time(), "stages": {}})
+        entry["stages"][stage] = value
+        entry["ts"] = time.time()
+        self.dirty = True
+
+    def evict(self):
+        now = time.time()
+        fresh = [(k, e) for k, e in self.entries.items() if now - e["ts"] <= self.max_age]
+        fresh.sort(key=lambda kv: kv[1]["ts"])
+        fresh = fresh[-self.max_entries:]
+        if len(fresh) != len(self.entries):
+            self.entries = dict(fresh)
+            self.dirty = True
+
+    def save(self):
+        self.evict()
+        if not self.dirty or not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = TranslationCache()
+    return _cache
+
+
+# --------------------------------------------------------------------
+# ŽETONŲ BIUDŽETAS IR SĄNAUDOS
+# max_tokens skaičiuojamas pagal įvesties dydį (ilgas postas nebenukerpamas
+# JSON viduryje), o kiekvieno skambučio "usage" kaupiamas per pakopą
+# (metrics) ir per postą (USAGE_LOG_FILE).
+# --------------------------------------------------------------------
+MAX_OUTPUT_TOKENS = 8192  # deepseek-chat atsakymo riba
+CHARS_PER_TOKEN = 3       # atsargus įvertis kirilicai ir lietuvių kalbai
+
+# pakopa -> (minimumas, santykis su įvestimi, priedas); minimumai - buvę
+# pastovūs max_tokens, todėl trumpiems postams niekas nesikeičia
+OUTPUT_BUDGETS = {
+    "merged": (1200, 2.0, 400),
+    "analysis": (900, 1.0, 300),
+    "draft": (1000, 1.2, 200),
+    "review": (1200, 1.3, 300),
+    "strict": (900, 1.2, 200),
+}
+DEFAULT_OUTPUT_BUDGET = (1200, 1.5, 300)
+
+# Rašymui reikalingi DECODED laukai ("literal" jam nieko neduoda)
+DECODED_FIELDS = ("original", "meaning", "lt_natural", "safe_in_lt")
+
+USAGE_LOG_FILE = "docs/translation_usage.json"
+USAGE_LOG_LIMIT = 500
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "cached_tokens")
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def output_budget(stage, user_content):
+    floor, ratio, extra = OUTPUT_BUDGETS.get(stage, DEFAULT_OUTPUT_BUDGET)
+    return min(MAX_OUTPUT_TOKENS, max(floor, int(ratio * estimate_tokens(user_content)) + extra))
+
+
+def _compact(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def compact_decoded(decoded):
+    return _compact([{f: e[f] for f in DECODED_FIELDS if e.get(f) is not None}
+                     for e in decoded if isinstance(e, dict)])
+
+
+# Vieno posto vertimo sąnaudos {pakopa: {laukas: reikšmė}}; kiekviena
+# asyncio užduotis turi savo kontekstą, todėl lygiagretūs vertimai nesusimaišo
+_usage_sink = contextvars.ContextVar("translate_usage", default=None)
+
+
+def _sink_add(sink, stage, field, value):
+    if sink is not None and value:
+        row = sink.setdefault(stage, {})
+        row[field] = round(row.get(field, 0) + value, 3)
+
+
+def usage_totals(usage):
+    return {f: round(sum(row.get(f, 0) for row in usage.values()), 1) for f in USAGE_FIELDS}
+
+
+def record_post_usage(post_id, key, mode, ok, seconds, usage, path=USAGE_LOG_FILE):
+    """Vieno posto vertimo sąnaudos -> USAGE_LOG_FILE (paskutiniai USAGE_LOG_LIMIT)."""
+    log = []
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                log = json.load(f)
+        except Exception as e:
+            logger.error(f"❌ {path} sugadintas, kuriamas naujas: {e}")
+    log.append(dict({"ts": round(time.time(), 1), "post_id": post_id, "key": key[:16],
+                     "mode": mode, "ok": ok, "seconds": round(seconds, 3)},
+                    **usage_totals(usage), stages=usage))
+    log = log[-USAGE_LOG_LIMIT:]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(log, f, ensure_ascii=False)
+    os.replace(tmp, path)
 
 
 # --------------------------------------------------------------------
 # DEEPSEEK SKAMBUTIS
+# Jungčių telkinys ir pakartojimų logika - http_retry modulyje.
 # --------------------------------------------------------------------
-def _call(api_key, messages, temperature=0.2, max_tokens=1200, force_json=False):
+MAX_ATTEMPTS = 3
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 30.0
+RETRY_AFTER_MAX_SECONDS = 120.0
+REQUEST_TIMEOUT = httpx.Timeout(90.0, connect=10.0)
+POOL_LIMITS = httpx.Limits(max_connections=8, max_keepalive_connections=4,
+                           keepalive_expiry=60.0)
+
+_pool = http_retry.ClientPool(REQUEST_TIMEOUT, POOL_LIMITS)
+
+
+async def aclose():
+    """Uždaro šio event loop'o DeepSeek klientą (paleidimo pabaigoje)."""
+    await _pool.aclose()
+
+
+def _backoff_delay(attempt, retry_after=None):
+    return http_retry.backoff_delay(attempt, BACKOFF_BASE_SECONDS, BACKOFF_MAX_SECONDS,
+                                    retry_after, RETRY_AFTER_MAX_SECONDS)
+
+
+def _record_usage(stage, usage):
+    """DeepSeek "usage" žetonai -> paleidimo metrikos (bendri ir pakopos)
+    ir šiuo metu verčiamo posto sąnaudos."""
+    if not usage:
+        return
+    fields = {"prompt_tokens": usage.get("prompt_tokens", 0),
+              "completion_tokens": usage.get("completion_tokens", 0),
+              "cached_tokens": usage.get("prompt_cache_hit_tokens", 0)}
+    for field, value in fields.items():
+        metrics.count(f"deepseek.{field}", value)
+        metrics.count(f"deepseek.{stage}.{field}", value)
+        _sink_add(_usage_sink.get(), stage, field, value)
+
+
+def _prepare_call(messages, stage, max_tokens):
+    # Įvesties įvertis (palyginimui su tikru prompt_tokens) ir atsakymo riba
+    estimated = sum(estimate_tokens(m["content"]) for m in messages)
+    metrics.count("deepseek.prompt_tokens_estimated", estimated)
+    metrics.count(f"deepseek.{stage}.prompt_tokens_estimated", estimated)
+    return max_tokens or output_budget(stage, messages[-1]["content"])
+
+
+def _record_call(stage, started):
+    sink = _usage_sink.get()
+    _sink_add(sink, stage, "calls", 1)
+    _sink_add(sink, stage, "seconds", time.monotonic() - started)
+
+
+async def _call(api_key, messages, temperature=0.2, max_tokens=None, force_json=False,
+                stage="call"):
+    max_tokens = _prepare_call(messages, stage, max_tokens)
     payload = {
         "model": DEEPSEEK_MODEL,
         "temperature": temperature,
@@ -167,25 +535,139 @@ def _call(api_key, messages, temperature=0.2, max_tokens=1200, force_json=False)
     headers = {"Content-Type": "application/json",
                "Authorization": f"Bearer {api_key}"}
 
+    client = _pool.get()
     reason = "nezinoma"
-    for attempt in (1, 2):
+    started = time.monotonic()
+    attempt = 0
+    while attempt < MAX_ATTEMPTS:
+        attempt += 1
+        retry_after = None
         try:
-            r = requests.post(DEEPSEEK_URL, json=payload, headers=headers, timeout=90)
+            with metrics.timer(f"deepseek.{stage}"):
+                r = await client.post(DEEPSEEK_URL, json=payload, headers=headers)
             if r.status_code == 200:
-                content = r.json()["choices"][0]["message"]["content"].strip()
+                body = r.json()
+                _record_usage(stage, body.get("usage"))
+                choice = body["choices"][0]
+                content = choice["message"]["content"].strip()
+                if force_json and choice.get("finish_reason") == "length":
+                    metrics.count("deepseek.truncated")
+                    if payload["max_tokens"] < MAX_OUTPUT_TOKENS:
+                        # Nukirptas JSON nepataisomas - kartojama su didesne riba.
+                        # Tai ne tinklo klaida: MAX_ATTEMPTS bandymas neeikvojamas,
+                        # o kartojimų kiekį riboja pati MAX_OUTPUT_TOKENS riba
+                        payload["max_tokens"] = min(MAX_OUTPUT_TOKENS, payload["max_tokens"] * 2)
+                        logger.warning(f"✂️ '{stage}' atsakymas nukirptas - max_tokens "
+                                       f"didinamas iki {payload['max_tokens']}")
+                        attempt -= 1
+                        continue
+                    # Riba pasiekta - grąžinam, ką turim (_json_or_none bandys išgelbėti)
+                    logger.warning(f"✂️ '{stage}' atsakymas nukirptas ties "
+                                   f"{MAX_OUTPUT_TOKENS} žetonų riba")
                 if content:
+                    _record_call(stage, started)
                     return content, True, ""
                 reason = "tuščias atsakymas"
             else:
                 reason = f"HTTP {r.status_code}: {r.text[:200]}"
+                if not http_retry.is_retryable(r.status_code):
+                    logger.warning(f"⚠️ DeepSeek bandymas {attempt} nepavyko: {reason}")
+                    break
+                if r.status_code in (429, 503):
+                    retry_after = http_retry.retry_after_seconds(r)
         except Exception as e:
             reason = f"{type(e).__name__}: {e}"
         logger.warning(f"⚠️ DeepSeek bandymas {attempt} nepavyko: {reason}")
-        if attempt == 1:
-            time.sleep(5)
+        if attempt < MAX_ATTEMPTS:
+            metrics.count("deepseek.retries")
+            await asyncio.sleep(_backoff_delay(attempt, retry_after))
+    _record_call(stage, started)
     return "", False, reason
 
 
+async def _call_stream(api_key, messages, stage, temperature=0.2, max_tokens=None):
+    """Kaip _call, bet su stream=True. Grąžina (tekstas, ok, priežastis,
+    pažeidimai); netuščias pažeidimų sąrašas reiškia nutrauktą srautą."""
+    payload = {
+        "model": DEEPSEEK_MODEL,
+        "temperature": temperature,
+        "top_p": 1,
+        "max_tokens": _prepare_call(messages, stage, max_tokens),
+        "messages": messages,
+        "stream": True,
+        "stream_options": {"include_usage": True},
+    }
+    headers = {"Content-Type": "application/json",
+               "Authorization": f"Bearer {api_key}"}
+
+    client = _pool.get()
+    reason = "nezinoma"
+    call_started = time.monotonic()
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        retry_after = None
+        started = time.monotonic()
+        ttft = None
+        parts = []
+        text = ""
+        try:
+            async with client.stream("POST", DEEPSEEK_URL, json=payload,
+                                     headers=headers) as r:
+                if r.status_code == 200:
+                    async for line in r.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            break
+                        chunk = json.loads(data)
+                        _record_usage(stage, chunk.get("usage"))
+                        choices = chunk.get("choices") or [{}]
+                        delta = (choices[0].get("delta") or {}).get("content") or ""
+                        if not delta:
+                            continue
+                        if ttft is None:
+                            ttft = time.monotonic() - started
+                        parts.append(delta)
+                        text = "".join(parts)
+                        # Tikrinama tik nauja dalis su persidengimu - frazė
+                        # gali būti perskelta per du gabalus
+                        violations = definitive_violations(
+                            text[-(len(delta) + STREAM_CHECK_WINDOW):])
+                        if violations:
+                            # Išėjus iš "async with" jungtis uždaroma -
+                            # generavimas serveryje nebelaukiamas
+                            record_stream_stats(stage, ttft, time.monotonic() - started, True)
+                            metrics.observe(f"deepseek.{stage}", time.monotonic() - started)
+                            metrics.count("deepseek.stream_aborts")
+                            logger.warning(f"✂️ Srautas '{stage}' nutrauktas po "
+                                           f"{len(text)} simbolių: {violations}")
+                            _record_call(stage, call_started)
+                            return text, True, "", violations
+                    record_stream_stats(stage, ttft, time.monotonic() - started, False)
+                    metrics.observe(f"deepseek.{stage}", time.monotonic() - started)
+                    text = text.strip()
+                    if text:
+                        _record_call(stage, call_started)
+                        return text, True, "", []
+                    reason = "tuščias atsakymas"
+                else:
+                    body = (await r.aread()).decode("utf-8", "replace")
+                    reason = f"HTTP {r.status_code}: {body[:200]}"
+                    if not http_retry.is_retryable(r.status_code):
+                        logger.warning(f"⚠️ DeepSeek bandymas {attempt} nepavyko: {reason}")
+                        break
+                    if r.status_code in (429, 503):
+                        retry_after = http_retry.retry_after_seconds(r)
+        except Exception as e:
+            reason = f"{type(e).__name__}: {e}"
+        logger.warning(f"⚠️ DeepSeek bandymas {attempt} nepavyko: {reason}")
+        if attempt < MAX_ATTEMPTS:
+            metrics.count("deepseek.retries")
+            await asyncio.sleep(_backoff_delay(attempt, retry_after))
+    _record_call(stage, call_started)
+    return "", False, reason, []
+
+
 def _json_or_none(raw):
     try:
         return json.loads(raw)
@@ -199,26 +681,301 @@ def _json_or_none(raw):
     return None
 
 
+# --------------------------------------------------------------------
+# PAKETINIS REŽIMAS
+# Paketo dydį riboja įvesties žetonų biudžetas (BATCH_TOKEN_BUDGET) ir
+# atsakymo riba (MAX_OUTPUT_TOKENS, sudedant postų output_budget).
+# --------------------------------------------------------------------
+BATCH_MODE = os.getenv("TRANSLATE_BATCH", "1") == "1"
+BATCH_MAX_POSTS = int(os.getenv("TRANSLATE_BATCH_MAX_POSTS", "8"))
+BATCH_TOKEN_BUDGET = int(os.getenv("TRANSLATE_BATCH_TOKENS", "6000"))
+
+
+def _batch_chunks(keys, items, stage):
+    chunk, size, answers = [], 0, 0
+    for key in keys:
+        item = _compact(items[key])
+        cost, answer = estimate_tokens(item), output_budget(stage, item)
+        if chunk and (len(chunk) >= BATCH_MAX_POSTS or size + cost > BATCH_TOKEN_BUDGET
+                      or answers + answer > MAX_OUTPUT_TOKENS):
+            yield chunk, answers
+            chunk, size, answers = [], 0, 0
+        chunk.append(key)
+        size += cost
+        answers += answer
+    if chunk:
+        yield chunk, answers
+
+
+class _StageBatch:
+    """Vienos pakopos (analizės ar peržiūros) užklausos iš lygiagrečiai
+    verčiamų postų. Siunčiama tada, kai kiekvienas postas jau arba pateikė
+    savo užklausą, arba pranešė (leave), kad šios pakopos jam nebereikės.
+    Postai, kurių atsakymo pakete nėra, verčiami įprastu skambučiu."""
+
+    def __init__(self, api_key, stage, system_prompt, keys):
+        self.api_key = api_key
+        self.stage = stage
+        self.system_prompt = system_prompt
+        self.pending = set(keys)
+        self.waiting = {}  # raktas -> (užklausa, atsarginis skambutis, future, usage)
+        self.tasks = set()
+
+    def submit(self, key, item, fallback):
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[key] = (item, fallback, future, _usage_sink.get())
+        self.leave(key)
+        return future
+
+    def leave(self, key):
+        self.pending.discard(key)
+        if self.pending or not self.waiting:
+            return
+        waiting, self.waiting = self.waiting, {}
+        task = asyncio.ensure_future(self._flush(waiting))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _flush(self, waiting):
+        items = {key: entry[0] for key, entry in waiting.items()}
+        chunks = _batch_chunks(list(waiting), items, self.stage)
+        await asyncio.gather(*(self._send(chunk, answer_tokens, waiting)
+                               for chunk, answer_tokens in chunks))
+
+    async def _send(self, keys, answer_tokens, waiting):
+        answers = {}
+        if len(keys) > 1:
+            ids = {str(i): key for i, key in enumerate(keys, 1)}
+            request = {"items": [dict(waiting[key][0], id=i) for i, key in ids.items()]}
+            metrics.count("translate.batch_calls")
+            metrics.count("translate.batch_items", len(keys))
+            stage = f"{self.stage}_batch"
+            usage = {}
+            _usage_sink.set(usage)  # šios užduoties kontekste - tik paketo žetonai
+            raw, ok, reason = await _call(self.api_key, [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": _compact(request)},
+            ], temperature=0.0, force_json=True, stage=stage, max_tokens=answer_tokens)
+            # Paketo kaina padalijama postams po lygiai
+            for key in keys:
+                for field, value in usage.get(stage, {}).items():
+                    _sink_add(waiting[key][3], stage, field, value / len(keys))
+            parsed = _json_or_none(raw) if ok else None
+            results = parsed.get("results") if isinstance(parsed, dict) else None
+            for result in results if isinstance(results, list) else []:
+                if isinstance(result, dict) and str(result.get("id")) in ids:
+                    answer = {k: v for k, v in result.items() if k != "id"}
+                    answers[ids[str(result["id"])]] = json.dumps(answer, ensure_ascii=False)
+            logger.info(f"📦 Paketinė '{self.stage}': {len(answers)}/{len(keys)} postų"
+                        + ("" if ok else f" (nepavyko: {reason})"))
+
+        async def resolve(key):
+            _, fallback, future, post_usage = waiting[key]
+            _usage_sink.set(post_usage)
+            try:
+                if key in answers:
+                    future.set_result((answers[key], True, ""))
+                else:
+                    if len(keys) > 1:
+                        metrics.count("translate.batch_fallbacks")
+                    future.set_result(await fallback())
+            except Exception as e:
+                future.set_exception(e)
+
+        await asyncio.gather(*(resolve(key) for key in keys))
+
+
+def _leave_batch(run, stage, key):
+    batch = run["batches"].get(stage)
+    if batch is not None:
+        batch.leave(key)
+
+
 # --------------------------------------------------------------------
 # PAGRINDINĖ FUNKCIJA
 # Grąžina (tekstas, ok, ataskaita)
 # --------------------------------------------------------------------
-def translate(api_key, source_text):
-    report = []
+def _cached_final(cache, key):
+    final = cache.get(key, "final")
+    if final is None:
+        return None
+    metrics.count("translate.cache_hits")
+    logger.info("🗃️ Vertimas paimtas iš cache")
+    return final["text"], final["ok"], final["report"]
+
+
+async def _translate_tracked(api_key, source_text, cache, key, batches, post_id):
+    run = {"mode": "full", "hard_check_failed": False, "batches": batches}
+    usage = {}
+    token = _usage_sink.set(usage)
+    started = time.monotonic()
+    ok = False
+    try:
+        text, ok, report = await _translate(api_key, source_text, cache, key, run)
+        return text, ok, report
+    finally:
+        _usage_sink.reset(token)
+        seconds = time.monotonic() - started
+        totals = usage_totals(usage)
+        record_mode_stats(run["mode"], seconds, ok, run["hard_check_failed"], totals)
+        record_post_usage(post_id, key, run["mode"], ok, seconds, usage)
+        metrics.observe("translate.total", seconds)
+        metrics.count(f"translate.mode.{run['mode']}")
+        logger.info(f"🪙 Vertimo sąnaudos: {totals['prompt_tokens']:.0f} + "
+                    f"{totals['completion_tokens']:.0f} žetonų "
+                    f"(cache: {totals['cached_tokens']:.0f})")
+
+
+async def translate_async(api_key, source_text, cache=None, post_id=None):
+    cache = cache if cache is not None else get_cache()
+    key = cache.key(source_text)
+
+    final = _cached_final(cache, key)
+    if final is not None:
+        return final
 
     if not api_key:
         return "", False, "DEEPSEEK_API_KEY nenustatytas"
 
+    try:
+        return await _translate_tracked(api_key, source_text, cache, key, {}, post_id)
+    finally:
+        cache.save()
+        logger.info(f"🗃️ Vertimų cache: {cache.stats()}")
+
+
+async def _batch_member(api_key, source_text, cache, key, batches, post_id):
+    try:
+        final = _cached_final(cache, key)
+        if final is not None:
+            return final
+        return await _translate_tracked(api_key, source_text, cache, key, batches, post_id)
+    finally:
+        # Nebaigtos pakopos nebelaukia šio posto (klaida, cache, greitas kelias)
+        for batch in batches.values():
+            batch.leave(key)
+
+
+async def translate_batch_async(api_key, items, cache=None):
+    """Keli postai vienu metu. items - [(posto ID, tekstas)].
+    Grąžina {posto ID: (tekstas, ok, ataskaita)}."""
+    cache = cache if cache is not None else get_cache()
+    if not api_key:
+        return {post_id: ("", False, "DEEPSEEK_API_KEY nenustatytas") for post_id, _ in items}
+
+    texts, post_ids = {}, {}
+    for post_id, source_text in items:
+        key = cache.key(source_text)
+        texts.setdefault(key, source_text)
+        post_ids.setdefault(key, post_id)
+    keys = list(texts)
+    batches = {}
+    if BATCH_MODE and len(keys) > 1:
+        batches = {
+            "analysis": _StageBatch(api_key, "analysis", ANALYZE_PROMPT + BATCH_SUFFIX, keys),
+            "review": _StageBatch(api_key, "review", REVIEW_PROMPT + BATCH_SUFFIX, keys),
+        }
+    try:
+        results = await asyncio.gather(*(_batch_member(api_key, texts[k], cache, k, batches,
+                                                       post_ids[k]) for k in keys))
+    finally:
+        cache.save()
+        logger.info(f"🗃️ Vertimų cache: {cache.stats()}")
+    by_key = dict(zip(keys, results))
+    return {post_id: by_key[cache.key(source_text)] for post_id, source_text in items}
+
+
+def translate(api_key, source_text, cache=None, post_id=None):
+    """Sinchroninis translate_async() apvalkalas (savo event loop'e)."""
+    async def run():
+        try:
+            return await translate_async(api_key, source_text, cache, post_id)
+        finally:
+            await aclose()
+    return asyncio.run(run())
+
+
+async def _cached_call(cache, key, stage, api_key, messages, batch=None, batch_item=None,
+                       **kwargs):
+    raw = cache.get(key, stage)
+    if raw is not None:
+        metrics.count("translate.cache_hits")
+        logger.info(f"🗃️ Pakopa '{stage}' paimta iš cache")
+        return raw, True, ""
+    metrics.count("translate.cache_misses")
+    if batch is not None:
+        raw, ok, reason = await batch.submit(
+            key, batch_item, lambda: _call(api_key, messages, stage=stage, **kwargs))
+    else:
+        raw, ok, reason = await _call(api_key, messages, stage=stage, **kwargs)
+    if ok:
+        cache.put(key, stage, raw)
+    return raw, ok, reason
+
+
+async def _cached_text_call(cache, key, stage, api_key, messages, **kwargs):
+    """Tekstinė pakopa: srautu (jei įjungta) arba įprastu skambučiu.
+    Grąžina (tekstas, ok, priežastis, pažeidimai)."""
+    if not STREAM_MODE:
+        raw, ok, reason = await _cached_call(cache, key, stage, api_key, messages, **kwargs)
+        return raw, ok, reason, []
+    raw = cache.get(key, stage)
+    if raw is not None:
+        metrics.count("translate.cache_hits")
+        logger.info(f"🗃️ Pakopa '{stage}' paimta iš cache")
+        return raw, True, "", []
+    metrics.count("translate.cache_misses")
+    raw, ok, reason, violations = await _call_stream(api_key, messages, stage, **kwargs)
+    if ok and not violations:
+        cache.put(key, stage, raw)
+    return raw, ok, reason, violations
+
+
+def _remember_final(cache, key, text, report):
+    cache.put(key, "final", {"text": text, "ok": True, "report": report})
+    return text, True, report
+
+
+async def _translate(api_key, source_text, cache, key, run):
+    report = []
+    review_skipped = False
+    analysis = None
+    draft = None
+
+    # ---------- 1+2. SUJUNGTA PAKOPA (trumpi postai) ----------
+    # Paketiniame režime analizė ir taip bendra - sujungta pakopa nenaudojama
+    if ADAPTIVE_MODE and len(source_text) <= MERGED_MAX_CHARS and not run["batches"]:
+        raw, ok, reason = await _cached_call(cache, key, "merged", api_key, [
+            {"role": "system", "content": MERGED_PROMPT},
+            {"role": "user", "content": source_text},
+        ], temperature=0.0, force_json=True)
+        merged = _json_or_none(raw) if ok else None
+        if merged and merged.get("facts"):
+            analysis = merged
+            post = (merged.get("post") or "").strip()
+            if post and merged.get("risk") == "low" and not merged.get("expressions"):
+                run["mode"] = "merged"
+                draft = post
+            else:
+                logger.info("🔀 Sujungta pakopa rado riziką - tęsiam pilna grandine")
+        else:
+            logger.info(f"🔀 Sujungta pakopa nepavyko ({reason or 'blogas JSON'}) - "
+                        f"tęsiam pilna grandine")
+
     # ---------- 1. ANALIZĖ ----------
-    raw, ok, reason = _call(api_key, [
-        {"role": "system", "content": ANALYZE_PROMPT},
-        {"role": "user", "content": source_text},
-    ], temperature=0.0, max_tokens=900, force_json=True)
+    if analysis is None:
+        raw, ok, reason = await _cached_call(cache, key, "analysis", api_key, [
+            {"role": "system", "content": ANALYZE_PROMPT},
+            {"role": "user", "content": source_text},
+        ], temperature=0.0, force_json=True,
+            batch=run["batches"].get("analysis"), batch_item={"text": source_text})
+    _leave_batch(run, "analysis", key)
 
-    if not ok:
-        return "", False, f"analizė nepavyko: {reason}"
+    if analysis is None:
+        if not ok:
+            return "", False, f"analizė nepavyko: {reason}"
+        analysis = _json_or_none(raw) or {}
 
-    analysis = _json_or_none(raw) or {}
     facts = analysis.get("facts") or source_text
     decoded = analysis.get("expressions") or []
     risk = analysis.get("risk", "low")
@@ -229,59 +986,79 @@ def translate(api_key, source_text):
             logger.info(f"   • {e.get('original')} → {e.get('meaning')} "
                         f"(lietuviškai veikia: {e.get('safe_in_lt')})")
 
+    # Greitas kelias: maža rizika ir nėra ką iššifruoti - atskira peržiūra
+    # praleidžiama, tekstą vis tiek tikrina deterministinis saugiklis
+    if run["mode"] != "merged":
+        run["mode"] = "fast" if ADAPTIVE_MODE and risk == "low" and not decoded else "full"
+    logger.info(f"🛣️ Vertimo režimas: {run['mode']} (rizika: {risk})")
+
     # ---------- 2. RAŠYMAS ----------
-    user_block = (
-        f"SOURCE:\n{source_text}\n\n"
-        f"FACTS:\n{facts}\n\n"
-        f"DECODED:\n{json.dumps(decoded, ensure_ascii=False, indent=1)}"
-    )
-    draft, ok, reason = _call(api_key, [
-        {"role": "system", "content": WRITE_PROMPT},
-        {"role": "user", "content": user_block},
-    ], temperature=0.2, max_tokens=1000)
-
-    if not ok:
-        return "", False, f"rašymas nepavyko: {reason}"
+    if draft is None:
+        user_block = (
+            f"SOURCE:\n{source_text}\n\n"
+            f"FACTS:\n{facts}\n\n"
+            f"DECODED:\n{compact_decoded(decoded)}"
+        )
+        messages = [
+            {"role": "system", "content": WRITE_PROMPT},
+            {"role": "user", "content": user_block},
+        ]
+        draft, ok, reason, early_problems = await _cached_text_call(
+            cache, key, "draft", api_key, messages, temperature=0.2)
 
-    # ---------- 3. PERŽIŪRA ----------
-    raw, ok, reason = _call(api_key, [
-        {"role": "system", "content": REVIEW_PROMPT},
-        {"role": "user", "content": f"FACTS:\n{facts}\n\nDRAFT:\n{draft}"},
-    ], temperature=0.0, max_tokens=1200, force_json=True)
+        if not ok:
+            return "", False, f"rašymas nepavyko: {reason}"
+    else:
+        early_problems = []
 
+    # ---------- 3. PERŽIŪRA ----------
+    # Nutrauktas juodraštis nebeperžiūrimas - iškart griežtas perrašymas
     final = draft
-    if ok:
-        rev = _json_or_none(raw)
-        if rev and rev.get("final"):
-            if not rev.get("ok", True):
-                report.append(f"peržiūra taisė: {'; '.join(rev.get('problems', []))}")
-                logger.info(f"✏️ Peržiūra taisė: {rev.get('problems')}")
-            final = rev["final"].strip()
-    else:
-        report.append(f"peržiūra praleista: {reason}")
+    if run["mode"] == "full" and not early_problems:
+        raw, ok, reason = await _cached_call(cache, key, "review", api_key, [
+            {"role": "system", "content": REVIEW_PROMPT},
+            {"role": "user", "content": f"FACTS:\n{facts}\n\nDRAFT:\n{draft}"},
+        ], temperature=0.0, force_json=True,
+            batch=run["batches"].get("review"), batch_item={"facts": facts, "draft": draft})
+
+        if ok:
+            rev = _json_or_none(raw)
+            if rev and rev.get("final"):
+                if not rev.get("ok", True):
+                    report.append(f"peržiūra taisė: {'; '.join(rev.get('problems', []))}")
+                    logger.info(f"✏️ Peržiūra taisė: {rev.get('problems')}")
+                final = rev["final"].strip()
+        else:
+            report.append(f"peržiūra praleista: {reason}")
+            review_skipped = True
+    _leave_batch(run, "review", key)
 
     # ---------- 4. SAUGIKLIS ----------
-    problems = hard_check(final)
+    problems = early_problems or hard_check(final)
     if problems:
+        run["hard_check_failed"] = True
         logger.warning(f"🛑 Saugiklis rado: {problems}. Perrašom griežtai (tik faktai).")
         report.append(f"saugiklis: {'; '.join(problems)}")
 
-        strict, ok, reason = _call(api_key, [
-            {"role": "system", "content": WRITE_PROMPT + (
-                "\n\nD. STRICT MODE — the previous attempt failed a safety check. "
-                "Throw away ALL irony, jokes and wordplay. Write only the plain facts "
-                "in the simplest possible Lithuanian. Nothing clever. Nothing borrowed "
-                "from the original's imagery.")},
+        messages = [
+            {"role": "system", "content": STRICT_PROMPT},
             {"role": "user", "content": f"FACTS:\n{facts}\n\nSOURCE:\n{source_text}"},
-        ], temperature=0.0, max_tokens=900)
+        ]
+        strict, ok, reason, strict_problems = await _cached_text_call(
+            cache, key, "strict", api_key, messages, temperature=0.0)
 
         if ok:
-            problems2 = hard_check(strict)
+            problems2 = strict_problems or hard_check(strict)
             if not problems2:
                 logger.info("✅ Griežtas perrašymas praėjo saugiklį.")
-                return strict, True, "; ".join(report) + " → perrašyta griežtai"
+                return _remember_final(cache, key, strict,
+                                       "; ".join(report) + " → perrašyta griežtai")
             report.append(f"griežtas perrašymas irgi krito: {'; '.join(problems2)}")
 
         return "", False, "; ".join(report)
 
-    return final, True, "; ".join(report) if report else "ok"
+    # Be peržiūros gautas tekstas į galutinį cache nededamas - kitą kartą
+    # peržiūra bus bandoma iš naujo (analizė ir juodraštis jau cache)
+    if review_skipped:
+        return final, True, "; ".join(report)
+    return _remember_final(cache, key, final, "; ".join(report) if report else "ok")